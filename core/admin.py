@@ -1,12 +1,46 @@
 # core/admin.py
-from django.contrib import admin
-from .models import Paciente, Medico, FilaAtendimento
+from django.contrib import admin, messages
+from .models import Paciente, Medico, FilaAtendimento, Unidade, Lotacao, EventoFila, CursorConsumidor, SequenciaSenha
 from .models import Paciente, Medico # Importa seus modelos
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
+from .privacidade import processar_em_lotes
 
 
-admin.site.register(Paciente)
+# Paciente: ações de privacidade (LGPD) em lotes curtos, as mesmas do comando anonimizar_pacientes.
+@admin.register(Paciente)
+class PacienteAdmin(admin.ModelAdmin):
+    list_display = ('nome_completo', 'unidade', 'carteira_sus', 'anonimizado_em')
+    list_filter = ('unidade',)
+    search_fields = ('nome_completo', 'carteira_sus')
+    actions = ['anonimizar_selecionados', 'excluir_selecionados_em_lotes']
+
+    def _processar(self, request, queryset, excluir):
+        pacientes, atendimentos, pulados = processar_em_lotes(list(queryset.values_list('pk', flat=True)), excluir=excluir)
+        acao = 'excluído(s)' if excluir else 'anonimizado(s)'
+        self.message_user(request, f"{pacientes} paciente(s) {acao}, {atendimentos} entrada(s) da fila processada(s).", messages.SUCCESS)
+        if pulados:
+            self.message_user(request, f"{pulados} paciente(s) pulado(s): já processados ou na fila agora.", messages.WARNING)
+
+    @admin.action(description='Anonimizar pacientes selecionados (LGPD)')
+    def anonimizar_selecionados(self, request, queryset):
+        self._processar(request, queryset, excluir=False)
+
+    @admin.action(description='Excluir pacientes selecionados e o histórico, em lotes', permissions=['excluir_em_lotes'])
+    def excluir_selecionados_em_lotes(self, request, queryset):
+        self._processar(request, queryset, excluir=True)
+
+    # Sem exclusão padrão do admin (botão "Apagar", página de confirmação e "delete_selected"): a página de
+    # confirmação monta a árvore do que vai ser apagado e carrega todo o histórico da fila em memória.
+    # Excluir paciente só pela ação em lotes acima, que avisa quem foi pulado por estar na fila.
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    # A ação em lotes continua exigindo a permissão de excluir paciente do usuário.
+    def has_excluir_em_lotes_permission(self, request):
+        return super().has_delete_permission(request)
+
+admin.site.register(Unidade)
 
 class MedicoInline(admin.StackedInline):
     model = Medico
@@ -14,16 +48,53 @@ class MedicoInline(admin.StackedInline):
     verbose_name_plural = 'Perfil Médico'
     fk_name = 'user'
 
+# Lotação: unidade dos usuários que não são médicos (atendentes).
+class LotacaoInline(admin.StackedInline):
+    model = Lotacao
+    can_delete = False
+    verbose_name_plural = 'Lotação (Unidade)'
+    fk_name = 'user'
+
 class UserAdmin(BaseUserAdmin):
-    inlines = (MedicoInline,) 
+    inlines = (MedicoInline, LotacaoInline) 
 
 admin.site.unregister(User) 
 admin.site.register(User, UserAdmin) 
 
 @admin.register(FilaAtendimento) 
 class FilaAtendimentoAdmin(admin.ModelAdmin):
-    list_display = ('paciente', 'medico_destino', 'status', 'data_hora_chegada')
-    list_filter = ('status', 'medico_destino')
-    search_fields = ('paciente__nome_completo',)
+    list_display = ('senha', 'paciente', 'unidade', 'medico_destino', 'status', 'data_hora_chegada')
+    list_filter = ('unidade', 'status', 'medico_destino')
+    search_fields = ('paciente__nome_completo', 'senha')
+
+# Log de eventos da fila: só leitura no admin (é append-only).
+@admin.register(EventoFila)
+class EventoFilaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'unidade', 'fila_id', 'medico_id', 'status_anterior', 'status_novo', 'usuario', 'criado_em')
+    list_filter = ('unidade', 'tipo')
+    readonly_fields = [f.name for f in EventoFila._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# Contadores das senhas do dia: só para consulta (quem mexe neles é core/senhas.py).
+@admin.register(SequenciaSenha)
+class SequenciaSenhaAdmin(admin.ModelAdmin):
+    list_display = ('unidade', 'prefixo', 'data', 'ultimo_numero')
+    list_filter = ('unidade', 'prefixo')
+    readonly_fields = ('unidade', 'prefixo', 'data', 'ultimo_numero')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(CursorConsumidor)
+class CursorConsumidorAdmin(admin.ModelAdmin):
+    list_display = ('nome', 'ultimo_evento_id', 'atualizado_em')
 
-print("Modelos Paciente e Medico (integrado) registrados no Admin!")
\ No newline at end of file
+print("Modelos Paciente e Medico (integrado) registrados no Admin!")
\ No newline at end of file
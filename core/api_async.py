@@ -0,0 +1,72 @@
+# core/api_async.py
+# API JSON assíncrona: views com métodos `async def` e ORM async (afirst, aexists, aget...),
+# servidas pelo gestor_filas/asgi.py (ex: uvicorn gestor_filas.asgi:application --workers 4).
+# Enquanto uma requisição espera o banco, o mesmo processo atende outras: com centenas de painéis
+# fazendo polling ao mesmo tempo, não preciso de um processo/thread parado por cliente.
+# É aqui que entram as próximas APIs dos quiosques e dos painéis de chamada.
+#
+# Os mixins de autenticação do Django (LoginRequiredMixin, UserPassesTestMixin) são síncronos
+# (leem request.user, que vai ao banco), então a permissão é conferida aqui com request.auser().
+# No WSGI estas views também funcionam (o Django roda a corrotina para cada requisição), só não ganham nada.
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+from django.views import View
+
+from .models import FilaAtendimento, Medico
+
+
+# Base das views da API async: confere login e grupo antes de chamar o método da view.
+class APIAsyncView(View):
+    grupo = None # Nome do grupo que pode usar a view (ex: 'Médicos'); None = qualquer usuário logado.
+
+    async def dispatch(self, request, *args, **kwargs):
+        usuario = await request.auser()
+        if not usuario.is_authenticated:
+            return redirect_to_login(request.get_full_path()) # Mesmo comportamento do LoginRequiredMixin.
+        if self.grupo and not await usuario.groups.filter(name=self.grupo).aexists():
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Acesso negado.'}, status=403)
+        self.usuario = usuario
+        return await super().dispatch(request, *args, **kwargs)
+
+
+# Versão async da MedicoPollingAPIView (core/views.py), com a mesma resposta JSON:
+# o painel do médico pode usar uma ou outra sem mudar o JavaScript.
+class MedicoPollingAsyncAPIView(APIAsyncView):
+    grupo = 'Médicos'
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            medico_logado = await Medico.objects.only('pk', 'unidade_id').aget(user_id=self.usuario.pk)
+        except Medico.DoesNotExist:
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Perfil de médico não encontrado.'}, status=403)
+
+        # As mesmas duas consultas da versão síncrona, pelo índice (unidade, medico_destino, status, ...).
+        fila_do_medico = FilaAtendimento.objects.filter(
+            unidade_id=medico_logado.unidade_id, medico_destino=medico_logado,
+        ).select_related('paciente')
+
+        atendimento_atual = await fila_do_medico.filter(status='EM_ATENDIMENTO').order_by('-data_hora_chamada').afirst()
+        if atendimento_atual:
+            return JsonResponse({
+                'status_geral': 'em_atendimento',
+                'atendimento_id': atendimento_atual.pk,
+                'senha': atendimento_atual.senha,
+                'paciente_id': atendimento_atual.paciente.pk,
+                'paciente_nome': atendimento_atual.paciente.nome_completo,
+                'status_atendimento': atendimento_atual.get_status_display(),
+                'hora_chamada': atendimento_atual.data_hora_chamada.strftime('%H:%M') if atendimento_atual.data_hora_chamada else None,
+            })
+
+        proximo_aguardando = await fila_do_medico.filter(status='AGUARDANDO').order_by('data_hora_chegada').afirst()
+        if proximo_aguardando:
+            return JsonResponse({
+                'status_geral': 'aguardando_proximo',
+                'atendimento_id': proximo_aguardando.pk,
+                'senha': proximo_aguardando.senha,
+                'paciente_id': proximo_aguardando.paciente.pk,
+                'paciente_nome': proximo_aguardando.paciente.nome_completo,
+                'status_atendimento': proximo_aguardando.get_status_display(),
+                'hora_chegada': proximo_aguardando.data_hora_chegada.strftime('%H:%M:%S'),
+            })
+
+        return JsonResponse({'status_geral': 'sem_pacientes_na_fila'})
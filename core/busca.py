@@ -0,0 +1,121 @@
+# core/busca.py
+# Busca textual (full-text) nas anotações clínicas, para o médico achar casos antigos pelo que escreveu.
+# Uso o full-text search do Postgres: cada FilaAtendimento e cada Paciente guardam um tsvector
+# (campo busca_vetor, com índice GIN) montado com o dicionário 'portuguese', que reduz as palavras
+# ao radical ("dores" acha "dor", "internado" acha "internação").
+#
+# Sem acento: o radical do 'portuguese' só sai certo do texto COM acento ("internação" e "internado"
+# viram "intern"; "internacao", sem acento, vira "internaca" e não acharia mais "internado").
+# Então o vetor guarda as duas formas: o texto original || o mesmo texto sem acento (tirado em Python),
+# e a busca faz OR do termo original com o termo sem acento. Quem escreve "cefaleia" acha "cefaléia"
+# pela forma sem acento, e o radical continua valendo pela forma original. Tudo isso sem depender da
+# extensão unaccent nem de uma configuração de busca criada à mão no banco.
+#
+# Os vetores são recalculados no post_save (core/signals.py), com um UPDATE só do busca_vetor.
+# Para preencher as linhas que já existiam antes da busca: python manage.py reindexar_busca
+import unicodedata
+from datetime import datetime, time, timedelta
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import FilaAtendimento, Paciente
+
+CONFIG_BUSCA = 'portuguese'
+
+# Campos indexados de cada modelo e o peso no ranking (A pesa mais que B, B mais que C).
+CAMPOS_FILA = [
+    ('evolucao_consulta', 'A'),
+    ('conduta_adotada', 'A'),
+    ('exame_outro_digitado', 'B'),
+]
+CAMPOS_PACIENTE = [
+    ('queixa_principal', 'A'),
+    ('evolucao_quadro', 'A'),
+    ('doencas_pre_existentes', 'B'),
+    ('alergias', 'B'),
+    ('caracteristicas_dor', 'B'),
+    ('localizacao_dor', 'C'),
+    ('inicio_doenca', 'C'),
+]
+CAMPOS_POR_MODELO = {FilaAtendimento: CAMPOS_FILA, Paciente: CAMPOS_PACIENTE}
+
+
+# O tsvector só existe no Postgres. Em outro banco (ex: SQLite de desenvolvimento) a busca fica desligada
+# e os signals não tentam atualizar vetor nenhum.
+def busca_disponivel(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+# "Cefaléia intensa" -> "Cefaleia intensa".
+def sem_acento(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto or '') if not unicodedata.combining(c))
+
+
+# Monta a expressão do tsvector a partir dos valores em memória, campo a campo com o seu peso:
+# texto original e, se tiver acento, o texto sem acento logo depois (mesmo peso).
+def vetor_de(instancia):
+    vetor = None
+    for campo, peso in CAMPOS_POR_MODELO[type(instancia)]:
+        texto = getattr(instancia, campo) or ''
+        for forma in dict.fromkeys([texto, sem_acento(texto)]): # Sem acento igual ao original: entra uma vez só.
+            parte = SearchVector(Value(forma), config=CONFIG_BUSCA, weight=peso)
+            vetor = parte if vetor is None else vetor + parte
+    return vetor
+
+
+# Termo original OR termo sem acento (ver o comentário do topo).
+def consulta_de(termos):
+    consulta = SearchQuery(termos, config=CONFIG_BUSCA, search_type='websearch')
+    if sem_acento(termos) != termos:
+        consulta |= SearchQuery(sem_acento(termos), config=CONFIG_BUSCA, search_type='websearch')
+    return consulta
+
+
+# Recalcula o busca_vetor de uma linha. UPDATE direto (e não save()) para não disparar o post_save de novo.
+def atualizar_vetor(instancia):
+    if not busca_disponivel():
+        return
+    type(instancia).objects.filter(pk=instancia.pk).update(busca_vetor=vetor_de(instancia))
+
+
+# Recalcula o vetor de várias linhas do mesmo modelo com UM UPDATE só (CASE pk WHEN ... THEN vetor).
+# Usado na reindexação em massa (comando reindexar_busca) e no benchmark. Retorna quantas linhas mudou.
+def atualizar_vetores_em_lote(instancias):
+    if not instancias or not busca_disponivel():
+        return 0
+    return type(instancias[0]).objects.filter(pk__in=[i.pk for i in instancias]).update(busca_vetor=Case(
+        *[When(pk=i.pk, then=vetor_de(i)) for i in instancias],
+        output_field=SearchVectorField(),
+    ))
+
+
+# Atendimentos do médico que batem com os termos, do mais relevante para o menos relevante.
+# Um atendimento entra se as anotações DELE batem, ou se os dados clínicos do paciente batem.
+# Os termos aceitam a sintaxe de busca web do Postgres: "frase exata", OR e -palavra_excluida.
+# inicio/fim são datas (date), inclusivas, comparadas com a chegada na fila.
+def buscar_atendimentos(medico, termos, inicio=None, fim=None):
+    consulta = consulta_de(termos)
+
+    # Os pacientes que batem saem de uma subquery no índice GIN de Paciente; as anotações, do índice GIN da fila.
+    pacientes = Paciente.objects.filter(unidade_id=medico.unidade_id, busca_vetor=consulta).values('pk')
+    atendimentos = FilaAtendimento.objects.filter(
+        unidade_id=medico.unidade_id,
+        medico_destino=medico,
+    ).filter(Q(busca_vetor=consulta) | Q(paciente_id__in=pacientes))
+
+    # Limites como datetime (meia-noite local) em vez de __date, para a comparação usar o índice da chegada.
+    if inicio:
+        atendimentos = atendimentos.filter(data_hora_chegada__gte=timezone.make_aware(datetime.combine(inicio, time.min)))
+    if fim:
+        atendimentos = atendimentos.filter(data_hora_chegada__lt=timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min)))
+
+    # Relevância = rank das anotações + rank do paciente (vetor nulo conta como zero).
+    # Os vetores em si não vão para o Python (defer): só servem para o WHERE e o rank.
+    return atendimentos.annotate(
+        relevancia=Coalesce(SearchRank(F('busca_vetor'), consulta), Value(0.0), output_field=FloatField())
+        + Coalesce(SearchRank(F('paciente__busca_vetor'), consulta), Value(0.0), output_field=FloatField())
+    ).select_related('paciente').defer('busca_vetor', 'paciente__busca_vetor').order_by('-relevancia', '-data_hora_chegada')
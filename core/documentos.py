@@ -0,0 +1,81 @@
+# core/documentos.py
+# Documentos para imprimir a partir de um atendimento (FilaAtendimento):
+#   - 'exames': pedido de exames (exames marcados + "outro exame" digitado);
+#   - 'resumo': resumo do atendimento (dados do paciente, evolução, conduta, exames, horários).
+# O mesmo código serve a view de impressão (um documento) e o comando gerar_documentos (o dia inteiro).
+#
+# Cache: cada documento renderizado fica no cache com uma chave que inclui a "impressão digital"
+# dos campos que aparecem nele. Se nada mudou desde a última renderização, o HTML vem pronto do cache;
+# se qualquer campo mudou, a chave muda e o documento é renderizado de novo (a chave velha só expira).
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import FilaAtendimento
+from .unidades import chave_cache
+
+# Mudou o layout dos templates? Aumente aqui para não servir HTML antigo do cache.
+VERSAO_DOCUMENTOS = 1
+
+TIPOS_DOCUMENTO = {
+    'exames': ('documentos/pedido_exames.html', 'Pedido de Exames'),
+    'resumo': ('documentos/resumo_atendimento.html', 'Resumo do Atendimento'),
+}
+
+# Um dia: o dia seguinte ainda reimprime do cache; depois disso, renderiza de novo.
+CACHE_DOCUMENTO_TIMEOUT = 24 * 60 * 60
+
+
+# Queryset com tudo o que os documentos mostram, em uma query só (sem query por atendimento no template).
+def atendimentos_para_impressao():
+    return FilaAtendimento.objects.select_related('unidade', 'paciente', 'medico_destino__user').defer(
+        'busca_vetor', 'paciente__busca_vetor',
+    )
+
+
+# Pedido de exames só faz sentido se algum exame foi pedido.
+def tem_exames(item_fila):
+    return bool(item_fila.exames_checkbox_selecionados or item_fila.exame_outro_digitado)
+
+
+# Os campos que aparecem nos documentos, em um formato estável (para a impressão digital e para o contexto).
+def _dados(item_fila):
+    paciente, medico = item_fila.paciente, item_fila.medico_destino
+    return {
+        'unidade': item_fila.unidade.nome,
+        'senha': item_fila.senha,
+        'paciente': [paciente.nome_completo, str(paciente.data_nascimento), paciente.idade, paciente.carteira_sus,
+                     paciente.nome_mae, paciente.plano_saude, paciente.alergias, paciente.doencas_pre_existentes],
+        'medico': [medico.user.get_full_name() or medico.user.username, medico.crm, medico.especialidade] if medico else None,
+        'status': item_fila.status,
+        'horarios': [str(d) if d else None for d in (item_fila.data_hora_chegada, item_fila.data_hora_chamada, item_fila.data_hora_fim)],
+        'exames': item_fila.exames_checkbox_selecionados or [],
+        'exame_outro': item_fila.exame_outro_digitado,
+        'evolucao': item_fila.evolucao_consulta,
+        'conduta': item_fila.conduta_adotada,
+    }
+
+
+def impressao_digital(item_fila, tipo):
+    conteudo = json.dumps([VERSAO_DOCUMENTOS, tipo, _dados(item_fila)], sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:32]
+
+
+# HTML do documento. Retorna (html, veio_do_cache).
+# O item precisa vir de atendimentos_para_impressao() (ou ter unidade/paciente/médico já carregados).
+def renderizar_documento(item_fila, tipo):
+    template, titulo = TIPOS_DOCUMENTO[tipo]
+    chave = chave_cache(item_fila.unidade_id, f'documento:{tipo}:{item_fila.pk}:{impressao_digital(item_fila, tipo)}')
+    html = cache.get(chave)
+    if html is not None:
+        return html, True
+    html = render_to_string(template, {
+        'atendimento': item_fila,
+        'paciente': item_fila.paciente,
+        'medico': item_fila.medico_destino,
+        'titulo': titulo,
+    })
+    cache.set(chave, html, CACHE_DOCUMENTO_TIMEOUT)
+    return html, False
@@ -0,0 +1,42 @@
+# core/documentos_processos.py
+# Trabalho dos processos filhos do comando gerar_documentos (core/management/commands/gerar_documentos.py).
+#
+# Fica num módulo à parte e sem importar models no topo: com o método "spawn" (Windows, macOS) ou
+# "forkserver" (padrão no Linux a partir do Python 3.14) o filho começa do zero e importa este módulo
+# para achar as funções ANTES de o Django estar configurado. Um `from core.models import ...` aqui em
+# cima daria AppRegistryNotReady no filho, e o pool inteiro quebraria (BrokenProcessPool).
+# Por isso o que depende dos apps é importado dentro das funções, depois do django.setup().
+from contextlib import nullcontext
+
+import django
+from django.utils.text import slugify
+
+from gestor_filas.db_router import ler_da_replica
+
+
+# Roda uma vez em cada processo filho. Com "spawn"/"forkserver" configura o Django do zero;
+# com "fork" o filho já vem configurado e o setup() não faz nada de novo.
+def iniciar_processo():
+    django.setup()
+
+
+def _nome_arquivo(item_fila, tipo):
+    medico = item_fila.medico_destino
+    pasta = slugify(medico.user.get_full_name() or medico.user.username) if medico else 'sem-medico'
+    return f"{pasta}/{item_fila.pk:07d}_{item_fila.senha or 'sem-senha'}_{tipo}.html"
+
+
+# Trabalho de um processo filho: um pedaço de ids -> lista de (nome no zip, html, veio_do_cache).
+def renderizar_pedaco(ids, tipos, usar_replica):
+    from core.documentos import atendimentos_para_impressao, renderizar_documento, tem_exames
+
+    with ler_da_replica() if usar_replica else nullcontext():
+        itens = list(atendimentos_para_impressao().filter(pk__in=ids).order_by('pk'))
+    documentos = []
+    for item_fila in itens:
+        for tipo in tipos:
+            if tipo == 'exames' and not tem_exames(item_fila):
+                continue # Sem exame pedido, não há pedido de exames para imprimir.
+            html, do_cache = renderizar_documento(item_fila, tipo)
+            documentos.append((_nome_arquivo(item_fila, tipo), html, do_cache))
+    return documentos
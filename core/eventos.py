@@ -0,0 +1,112 @@
+# core/eventos.py
+# Log de eventos da fila (transactional outbox): gravação e leitura por cursor.
+#
+# Quem grava: só as funções de core/transicoes.py (individuais e em lote), sempre dentro da mesma transação da mudança.
+# Quem lê: qualquer consumidor (cache, tela ao vivo, relatório, auditoria), de duas formas:
+#   - eventos_desde(cursor): leitura "sem estado", o chamador guarda o cursor onde quiser;
+#   - consumir(nome, processar): o cursor fica salvo no banco (CursorConsumidor) e só avança
+#     se o processamento do lote terminar sem erro (entrega "pelo menos uma vez").
+#
+# Ids fora de ordem: o id sai da sequence no INSERT, mas o evento só aparece no COMMIT. Com duas
+# transações juntas, o id 10 pode ficar visível depois do 11; se o cursor já tiver passado do 11,
+# o 10 nunca seria entregue. Por isso o cursor não atravessa um "buraco" nos ids (id que falta entre
+# dois eventos) enquanto o evento depois do buraco for mais novo que settings.EVENTOS_ATRASO_SEGURANCA:
+# o id que falta pode ser de uma transação ainda aberta. Passado o atraso, o buraco é tratado como
+# rollback (id perdido de vez) e o cursor segue. Eventos com ids seguidos são entregues na hora.
+# O atraso PRECISA ser maior que a transação mais longa que grava eventos (as transições em lote de
+# core/transicoes.py e o comando encerrar_filas_antigas são as mais demoradas). A idade é medida
+# pelo relógio do banco (criado_em usa db_default=Now()), não pelo relógio de cada servidor.
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Now
+
+from .models import CursorConsumidor, EventoFila
+
+# Tamanho padrão do lote de leitura.
+LIMITE_PADRAO = 500
+
+
+def atraso_seguranca():
+    return timedelta(seconds=settings.EVENTOS_ATRASO_SEGURANCA)
+
+
+# Grava um evento. Deve ser chamada dentro da transação que fez a mudança na fila.
+def registrar_evento(item_fila, tipo, status_anterior='', usuario=None, **dados):
+    return EventoFila.objects.create(
+        unidade_id=item_fila.unidade_id,
+        fila_id=item_fila.pk,
+        medico_id=item_fila.medico_destino_id,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+        tipo=tipo,
+        status_anterior=status_anterior,
+        status_novo=item_fila.status,
+        dados=dados,
+    )
+
+
+# Versão em lote do registrar_evento, para as transições em lote (um INSERT só).
+# 'linhas' são dicts com pk, status (anterior) e medico_destino_id de cada entrada alterada.
+def registrar_eventos_em_lote(unidade_id, linhas, tipo, status_novo, usuario=None, medico_id=None, **dados):
+    usuario = usuario if usuario is not None and usuario.is_authenticated else None
+    return EventoFila.objects.bulk_create([
+        EventoFila(
+            unidade_id=unidade_id,
+            fila_id=linha['pk'],
+            medico_id=medico_id if medico_id is not None else linha['medico_destino_id'],
+            usuario=usuario,
+            tipo=tipo,
+            status_anterior=linha['status'],
+            status_novo=status_novo,
+            dados=dict(dados, medico_anterior_id=linha['medico_destino_id']) if tipo == 'REATRIBUIDO' else dados,
+        )
+        for linha in linhas
+    ])
+
+
+# Até que id o cursor pode andar: percorre os próximos `limite` ids (de todas as unidades, porque o
+# buraco pode ser de outra unidade) e para antes do primeiro buraco ainda mais novo que o atraso.
+# "maduro" é calculado no banco, na mesma consulta, com o relógio do banco.
+def _limite_seguro(cursor, limite):
+    maduro = ExpressionWrapper(Q(criado_em__lte=Now() - atraso_seguranca()), output_field=BooleanField())
+    ids = EventoFila.objects.filter(pk__gt=cursor).annotate(maduro=maduro).order_by('pk').values_list('pk', 'maduro')
+    seguro = cursor
+    for pk, ja_maduro in ids[:limite]:
+        if pk != seguro + 1 and not ja_maduro:
+            break # Falta id antes deste, e ainda pode ser uma transação aberta: espero.
+        seguro = pk
+    return seguro
+
+
+# Retorna (eventos, novo_cursor) com os eventos de id maior que o cursor, em ordem.
+# Com unidade_id, o cursor também anda sobre os eventos das outras unidades (que não são entregues),
+# para o consumidor de uma unidade não ficar parado atrás de um monte de eventos que não são dele.
+# Se não houver nada novo, o cursor volta igual.
+def eventos_desde(cursor=0, unidade_id=None, limite=LIMITE_PADRAO):
+    novo_cursor = _limite_seguro(cursor, limite)
+    if novo_cursor == cursor:
+        return [], cursor
+    eventos = EventoFila.objects.filter(pk__gt=cursor, pk__lte=novo_cursor)
+    if unidade_id is not None:
+        eventos = eventos.filter(unidade_id=unidade_id) # Usa o índice (unidade, id).
+    return list(eventos.order_by('pk')), novo_cursor
+
+
+# Lê o próximo lote do consumidor 'nome', chama processar(eventos) e avança o cursor salvo.
+# O cursor fica travado (select_for_update) durante o lote, então dois processos do mesmo
+# consumidor nunca processam o mesmo lote ao mesmo tempo. Se processar() der erro, o cursor
+# não anda e o lote é entregue de novo na próxima chamada.
+# Retorna quantos eventos foram processados (0 = consumidor em dia).
+def consumir(nome, processar, unidade_id=None, limite=LIMITE_PADRAO):
+    with transaction.atomic():
+        CursorConsumidor.objects.get_or_create(nome=nome)
+        cursor = CursorConsumidor.objects.select_for_update().get(nome=nome)
+        eventos, novo_cursor = eventos_desde(cursor.ultimo_evento_id, unidade_id=unidade_id, limite=limite)
+        if eventos:
+            processar(eventos)
+        if novo_cursor != cursor.ultimo_evento_id:
+            cursor.ultimo_evento_id = novo_cursor
+            cursor.save(update_fields=['ultimo_evento_id', 'atualizado_em'])
+        return len(eventos)
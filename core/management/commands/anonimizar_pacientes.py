@@ -0,0 +1,79 @@
+# core/management/commands/anonimizar_pacientes.py
+# Atende pedidos de privacidade (LGPD) em massa: anonimiza (padrão) ou exclui (--excluir) pacientes,
+# em lotes curtos, mostrando o progresso (ver core/privacidade.py).
+# Pode ser interrompido e rodado de novo com a mesma lista: o que já foi feito é pulado.
+#
+# Uso:
+#   python manage.py anonimizar_pacientes --ids 10,11,12
+#   python manage.py anonimizar_pacientes --arquivo pedidos_lgpd.txt --lote 200     # um id por linha
+#   python manage.py anonimizar_pacientes --arquivo pedidos_lgpd.txt --excluir --pausa 0.5
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Paciente
+from core.privacidade import LOTE_ATENDIMENTOS_PADRAO, processar_em_lotes
+
+
+class Command(BaseCommand):
+    help = 'Anonimiza (ou exclui, com --excluir) pacientes em lotes curtos, com progresso. Pode ser retomado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', help='Ids dos pacientes, separados por vírgula.')
+        parser.add_argument('--arquivo', help='Arquivo texto com um id de paciente por linha.')
+        parser.add_argument('--unidade', type=int, help='Só pacientes desta unidade (id), mesmo que a lista tenha outros.')
+        parser.add_argument('--excluir', action='store_true', help='Exclui paciente e histórico, em vez de anonimizar.')
+        parser.add_argument('--lote', type=int, default=200, help='Pacientes por transação. Padrão: 200.')
+        parser.add_argument('--lote-atendimentos', type=int, default=LOTE_ATENDIMENTOS_PADRAO,
+                            help=f'Entradas da fila por UPDATE/DELETE. Padrão: {LOTE_ATENDIMENTOS_PADRAO}.')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Segundos de pausa entre lotes (alivia banco e réplica). Padrão: 0.')
+        parser.add_argument('--dry-run', action='store_true', help='Não altera nada, só mostra quantos seriam processados.')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['lote_atendimentos'] < 1:
+            raise CommandError('--lote e --lote-atendimentos precisam ser maiores que zero.')
+        ids = self._ler_ids(options)
+        if options['unidade']:
+            ids = list(Paciente.objects.filter(pk__in=ids, unidade_id=options['unidade']).values_list('pk', flat=True))
+
+        acao = 'excluído(s)' if options['excluir'] else 'anonimizado(s)'
+        if options['dry_run']:
+            pendentes = Paciente.objects.filter(pk__in=ids)
+            if not options['excluir']:
+                pendentes = pendentes.filter(anonimizado_em__isnull=True)
+            self.stdout.write(f"{pendentes.count()} de {len(ids)} paciente(s) seriam {acao} (DRY-RUN, nada foi alterado).")
+            return
+
+        inicio = time.perf_counter()
+
+        def progresso(numero, pacientes, atendimentos, pulados):
+            self.stdout.write(f"  lote {numero}: {pacientes} paciente(s) {acao}, {atendimentos} entrada(s) da fila, "
+                              f"{pulados} pulado(s) até agora ({time.perf_counter() - inicio:.1f} s)")
+            if options['pausa']:
+                time.sleep(options['pausa'])
+
+        pacientes, atendimentos, pulados = processar_em_lotes(
+            ids, excluir=options['excluir'], lote=options['lote'],
+            lote_atendimentos=options['lote_atendimentos'], progresso=progresso,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Total: {pacientes} paciente(s) {acao}, {atendimentos} entrada(s) da fila, {pulados} pulado(s) "
+            f"(já feitos, inexistentes ou na fila agora; rode de novo mais tarde para estes últimos)."
+        ))
+
+    def _ler_ids(self, options):
+        textos = []
+        if options['ids']:
+            textos += options['ids'].split(',')
+        if options['arquivo']:
+            try:
+                with open(options['arquivo'], encoding='utf-8') as arquivo:
+                    textos += arquivo.read().split()
+            except OSError as e:
+                raise CommandError(f'Não consegui ler {options["arquivo"]}: {e}')
+        if not textos:
+            raise CommandError('Informe --ids ou --arquivo.')
+        try:
+            return sorted({int(t) for t in textos if t.strip()})
+        except ValueError:
+            raise CommandError('Os ids dos pacientes precisam ser números inteiros.')
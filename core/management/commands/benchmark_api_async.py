@@ -0,0 +1,173 @@
+# core/management/commands/benchmark_api_async.py
+# Benchmark do polling do painel do médico: WSGI x ASGI, com centenas de clientes ao mesmo tempo.
+# Não sobe servidor nenhum: mede servidores que já estão rodando, com o mesmo banco deste settings.
+# Cada cliente é uma conexão HTTP/1.1 keep-alive (cliente feito com asyncio, só biblioteca padrão)
+# que faz GET no endpoint sem parar, logado como um médico (sessão criada aqui, direto no banco).
+# Para cada cenário mostra a vazão (req/s) e as latências p50/p95/p99.
+#
+# Cenários:
+#   - wsgi:       servidor WSGI (gestor_filas/wsgi.py) + view síncrona  (api/medico/status-fila/)
+#   - asgi-sync:  servidor ASGI (gestor_filas/asgi.py) + view síncrona  (roda em thread)
+#   - asgi-async: servidor ASGI (gestor_filas/asgi.py) + view async     (api/async/medico/status-fila/)
+#
+# Exemplo (mesmo número de processos nos dois, e o mesmo DJANGO_SETTINGS_MODULE dos servidores):
+#   gunicorn gestor_filas.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+#   uvicorn gestor_filas.asgi:application --workers 4 --port 8001
+#   python manage.py benchmark_api_async --wsgi http://127.0.0.1:8000 --asgi http://127.0.0.1:8001 --clientes 300
+#
+# Com 300 clientes, confira o limite de arquivos abertos (ulimit -n) e o DB_POOL_MAX x processos
+# contra o max_connections do Postgres.
+import asyncio
+import math
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+
+# Lê uma resposta HTTP/1.1 inteira. Retorna (status, servidor_vai_fechar_a_conexao).
+async def _ler_resposta(leitor):
+    linha = await leitor.readline()
+    if not linha:
+        raise ConnectionError('conexão fechada pelo servidor')
+    status = int(linha.split()[1])
+    cabecalhos = {}
+    while True:
+        linha = await leitor.readline()
+        if linha in (b'\r\n', b'\n', b''):
+            break
+        nome, _, valor = linha.decode('latin-1').partition(':')
+        cabecalhos[nome.strip().lower()] = valor.strip().lower()
+
+    fechar = cabecalhos.get('connection') == 'close'
+    if 'content-length' in cabecalhos:
+        await leitor.readexactly(int(cabecalhos['content-length']))
+    elif cabecalhos.get('transfer-encoding') == 'chunked':
+        while True:
+            tamanho = int((await leitor.readline()).split(b';')[0], 16)
+            await leitor.readexactly(tamanho + 2) # O pedaço e o \r\n depois dele.
+            if tamanho == 0:
+                break
+    else:
+        await leitor.read() # Sem tamanho: o corpo vai até o servidor fechar.
+        fechar = True
+    return status, fechar
+
+
+class Command(BaseCommand):
+    help = 'Compara vazão e p99 do polling do médico em servidores WSGI e ASGI já rodando, com muitos clientes simultâneos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', help='URL base do servidor WSGI (ex: http://127.0.0.1:8000).')
+        parser.add_argument('--asgi', help='URL base do servidor ASGI (ex: http://127.0.0.1:8001).')
+        parser.add_argument('--clientes', type=int, default=300, help='Clientes (conexões) simultâneos. Padrão: 300.')
+        parser.add_argument('--duracao', type=float, default=20, help='Segundos medindo cada cenário. Padrão: 20.')
+        parser.add_argument('--aquecimento', type=float, default=3, help='Segundos antes de começar a medir (não contam). Padrão: 3.')
+        parser.add_argument('--medico', help='Username do médico logado nos clientes. Padrão: o primeiro médico cadastrado.')
+
+    def handle(self, *args, **options):
+        if not options['wsgi'] and not options['asgi']:
+            raise CommandError('Informe --wsgi e/ou --asgi.')
+        if options['clientes'] < 1 or options['duracao'] <= 0:
+            raise CommandError('--clientes e --duracao precisam ser maiores que zero.')
+
+        usuarios = User.objects.filter(medico__isnull=False, groups__name='Médicos').order_by('pk')
+        if options['medico']:
+            usuarios = usuarios.filter(username=options['medico'])
+        usuario = usuarios.first()
+        if usuario is None:
+            raise CommandError('Nenhum médico encontrado (grupo "Médicos" com perfil de Medico).')
+
+        cenarios = []
+        if options['wsgi']:
+            cenarios.append(('wsgi', options['wsgi'], reverse('api_medico_status_fila')))
+        if options['asgi']:
+            cenarios.append(('asgi-sync', options['asgi'], reverse('api_medico_status_fila')))
+            cenarios.append(('asgi-async', options['asgi'], reverse('api_async_medico_status_fila')))
+
+        sessao = self._criar_sessao(usuario)
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Polling como {usuario.username}: {options['clientes']} clientes, {options['duracao']:.0f} s por cenário"
+            ))
+            for nome, base, caminho in cenarios:
+                resultado = asyncio.run(self._medir(base, caminho, sessao.session_key, options))
+                self._mostrar(nome, base + caminho, resultado)
+        finally:
+            sessao.delete()
+
+    # Sessão de login "de verdade" (a mesma que o login gravaria), lida pelos servidores no mesmo banco.
+    def _criar_sessao(self, usuario):
+        sessao = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+        sessao[SESSION_KEY] = str(usuario.pk)
+        sessao[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sessao[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sessao.create()
+        return sessao
+
+    async def _medir(self, base, caminho, chave_sessao, options):
+        url = urlsplit(base)
+        host, porta = url.hostname, url.port or 80
+        requisicao = (
+            f"GET {caminho} HTTP/1.1\r\nHost: {url.netloc}\r\nAccept: application/json\r\n"
+            f"Cookie: {settings.SESSION_COOKIE_NAME}={chave_sessao}\r\nConnection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        latencias, codigos, erros = [], {}, [0]
+        comeco_medicao = time.perf_counter() + options['aquecimento']
+        fim = comeco_medicao + options['duracao']
+
+        async def cliente():
+            leitor = escritor = None
+            while time.perf_counter() < fim:
+                try:
+                    if escritor is None:
+                        leitor, escritor = await asyncio.open_connection(host, porta)
+                    inicio = time.perf_counter()
+                    escritor.write(requisicao)
+                    await escritor.drain()
+                    status, fechar = await _ler_resposta(leitor)
+                    terminou = time.perf_counter()
+                    if comeco_medicao <= terminou <= fim: # Só conta o que terminou dentro da janela medida.
+                        latencias.append(terminou - inicio)
+                        codigos[status] = codigos.get(status, 0) + 1
+                except (OSError, ValueError, asyncio.IncompleteReadError):
+                    erros[0] += 1
+                    fechar = True
+                    await asyncio.sleep(0.05) # Não fico martelando um servidor que recusou a conexão.
+                if fechar and escritor is not None:
+                    escritor.close()
+                    leitor = escritor = None
+            if escritor is not None:
+                escritor.close()
+
+        tarefas = [asyncio.create_task(cliente()) for _ in range(options['clientes'])]
+        # Passada a janela, não espero para sempre as requisições que ficaram presas no servidor.
+        _, presas = await asyncio.wait(tarefas, timeout=fim - time.perf_counter() + 10)
+        for tarefa in presas:
+            tarefa.cancel()
+        await asyncio.gather(*presas, return_exceptions=True)
+        return latencias, codigos, erros[0], options['duracao']
+
+    def _mostrar(self, nome, url, resultado):
+        latencias, codigos, erros, duracao = resultado
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{nome}  ({url})"))
+        if not latencias:
+            self.stdout.write(self.style.ERROR(f"  nenhuma resposta medida ({erros} erro(s) de conexão)."))
+            return
+        ms = sorted(d * 1000 for d in latencias)
+
+        def percentil(p):
+            return ms[max(math.ceil(p * len(ms)) - 1, 0)]
+
+        self.stdout.write(f"  vazão:      {len(ms) / duracao:8.1f} req/s  ({len(ms)} respostas)")
+        self.stdout.write(f"  latência:   p50 {statistics.median(ms):.1f} ms   p95 {percentil(0.95):.1f} ms   "
+                          f"p99 {percentil(0.99):.1f} ms   máx {ms[-1]:.1f} ms")
+        estilo = self.style.SUCCESS if set(codigos) == {200} and not erros else self.style.WARNING
+        self.stdout.write(estilo(f"  respostas:  {codigos}   erros de conexão: {erros}"))
@@ -0,0 +1,172 @@
+# core/management/commands/benchmark_busca.py
+# Benchmark da busca textual nas anotações clínicas (core/busca.py) sobre um histórico grande.
+# Cria uma unidade temporária com médicos, pacientes e muitos atendimentos antigos com texto
+# clínico variado, preenche os vetores em lote, e compara, para várias buscas de um médico:
+#   - a busca textual (índices GIN, radicais do português, sem acento, ranqueada);
+#   - o jeito "antigo": icontains em todos os campos de texto (varredura da tabela).
+# Mostra p50/p95 de cada uma (contagem + primeira página, como a tela faz) e o plano da busca textual.
+#
+# Uso: python manage.py benchmark_busca --atendimentos 200000 --pacientes 20000
+# Só roda no PostgreSQL (é o único banco com tsvector).
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from core.busca import atualizar_vetores_em_lote, buscar_atendimentos, busca_disponivel
+from core.models import FilaAtendimento, Medico, Paciente, Unidade
+
+EVOLUCOES = [
+    'Paciente refere cefaléia intensa há {n} dias, sem melhora com analgésico.',
+    'Dor torácica em aperto, sem irradiação, iniciada em repouso.',
+    'Dor abdominal difusa, pior após alimentação.',
+    'Tosse seca e febre baixa há {n} dias.',
+    'Crise de asma leve, boa resposta ao broncodilatador.',
+    'Hipertensão descompensada, PA 170x100.',
+    'Diabetes em acompanhamento, glicemia de jejum elevada.',
+    'Lombalgia mecânica após esforço físico.',
+    'Quadro gripal sem sinais de alarme.',
+    'Dispnéia aos esforços, piora progressiva.',
+    'Náuseas e vômitos desde ontem.',
+    'Tontura rotatória ao mudar de posição.',
+]
+CONDUTAS = [
+    'Prescrito analgésico e retorno em {n} dias.',
+    'Solicitado eletrocardiograma e troponina.',
+    'Encaminhado para internação.',
+    'Orientado repouso e hidratação.',
+    'Ajuste da dose do anti-hipertensivo.',
+    'Encaminhado ao cardiologista.',
+    'Solicitada radiografia de tórax.',
+]
+EXAMES_OUTROS = ['Ultrassonografia de abdome', 'Espirometria', 'Tomografia de crânio', None, None, None]
+QUEIXAS = ['Dor de cabeça', 'Falta de ar', 'Dor nas costas', 'Febre', 'Dor no peito', 'Enjoo']
+ALERGIAS = ['Dipirona', 'Penicilina', 'Sulfa', None, None]
+DOENCAS = ['Hipertensão', 'Diabetes tipo 2', 'Asma', 'Hipotireoidismo', None, None]
+
+# Buscas que um médico faria, com acento, sem acento, frase exata, exclusão e OR.
+BUSCAS = ['cefaleia', 'dor toracica', '"dor abdominal"', 'asma -febre', 'hipertensão OR diabetes', 'internação', 'dispneia']
+
+
+class Command(BaseCommand):
+    help = 'Mede a busca textual nas anotações clínicas contra a busca por icontains, em um histórico grande semeado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--atendimentos', type=int, default=100000, help='Atendimentos antigos a criar. Padrão: 100000.')
+        parser.add_argument('--pacientes', type=int, default=10000, help='Pacientes a criar. Padrão: 10000.')
+        parser.add_argument('--medicos', type=int, default=10, help='Médicos na unidade. Padrão: 10.')
+        parser.add_argument('--repeticoes', type=int, default=20, help='Quantas vezes cada busca é medida. Padrão: 20.')
+        parser.add_argument('--manter', action='store_true', help='Não apaga os dados criados no final.')
+
+    def handle(self, *args, **options):
+        if not busca_disponivel():
+            raise CommandError('A busca textual precisa do PostgreSQL.')
+
+        sufixo = uuid.uuid4().hex[:6]
+        acaso = random.Random(42) # Semente fixa: o mesmo histórico a cada rodada.
+        unidade = Unidade.objects.create(nome=f'Benchmark {sufixo}', sigla=f'B{sufixo}')
+        try:
+            medicos = self._semear(unidade, sufixo, acaso, options)
+            medico = medicos[0]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Buscas de um médico (~{options['atendimentos'] // options['medicos']} atendimentos dele, "
+                f"{options['atendimentos']} na unidade), {options['repeticoes']} repetições cada"
+            ))
+            for termos in BUSCAS:
+                textual = self._medir(lambda: buscar_atendimentos(medico, termos), options['repeticoes'])
+                varredura = self._medir(lambda: self._busca_icontains(medico, termos), options['repeticoes'])
+                self.stdout.write(
+                    f"  {termos:26} textual: {textual['total']:6} achados, p50 {textual['p50']:7.1f} ms, p95 {textual['p95']:7.1f} ms"
+                    f"   |  icontains: {varredura['total']:6} achados, p50 {varredura['p50']:7.1f} ms, p95 {varredura['p95']:7.1f} ms"
+                )
+
+            self.stdout.write(self.style.MIGRATE_HEADING("Plano da busca textual ('dor toracica', primeira página):"))
+            self.stdout.write(buscar_atendimentos(medico, 'dor toracica')[:20].explain(analyze=True))
+        finally:
+            if not options['manter']:
+                self._limpar(unidade, sufixo)
+
+    # Contagem + primeira página, como a BuscaAtendimentosView faz (Paginator).
+    def _medir(self, montar_queryset, repeticoes):
+        tempos, total = [], 0
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            queryset = montar_queryset()
+            total = queryset.count()
+            list(queryset[:20])
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+        return {'total': total, 'p50': statistics.median(tempos), 'p95': tempos[max(int(len(tempos) * 0.95) - 1, 0)]}
+
+    # O que daria para fazer sem a busca textual: cada palavra com icontains em todos os campos.
+    # (Sem radical, sem ignorar acento e sem entender aspas/OR/-: os números de achados não batem, e é esse o ponto.)
+    def _busca_icontains(self, medico, termos):
+        filtro = Q()
+        for palavra in termos.replace('"', '').split():
+            if palavra == 'OR' or palavra.startswith('-'):
+                continue
+            filtro &= (
+                Q(evolucao_consulta__icontains=palavra) | Q(conduta_adotada__icontains=palavra)
+                | Q(exame_outro_digitado__icontains=palavra) | Q(paciente__queixa_principal__icontains=palavra)
+                | Q(paciente__doencas_pre_existentes__icontains=palavra)
+            )
+        return FilaAtendimento.objects.filter(filtro, unidade_id=medico.unidade_id, medico_destino=medico).order_by('-data_hora_chegada')
+
+    def _semear(self, unidade, sufixo, acaso, options):
+        inicio = time.perf_counter()
+        medicos = [
+            Medico.objects.create(user=User.objects.create_user(f'med_{sufixo}_{i}'), unidade=unidade,
+                                  especialidade='Clínica Geral', crm=f'B{sufixo}{i}')
+            for i in range(options['medicos'])
+        ]
+        pacientes = Paciente.objects.bulk_create([
+            Paciente(
+                unidade=unidade, nome_completo=f'Paciente {i}', data_nascimento='1970-01-01', nome_mae='Mãe',
+                carteira_sus=f'B{sufixo}{i:07d}', queixa_principal=acaso.choice(QUEIXAS),
+                alergias=acaso.choice(ALERGIAS), doencas_pre_existentes=acaso.choice(DOENCAS),
+            )
+            for i in range(options['pacientes'])
+        ], batch_size=2000)
+
+        agora = timezone.now()
+        criados = 0
+        while criados < options['atendimentos']:
+            lote = []
+            for _ in range(min(5000, options['atendimentos'] - criados)):
+                chegada = agora - timedelta(minutes=acaso.randrange(3 * 365 * 24 * 60)) # Últimos 3 anos.
+                lote.append(FilaAtendimento(
+                    unidade=unidade, paciente=acaso.choice(pacientes), medico_destino=acaso.choice(medicos),
+                    status='ATENDIDO', data_hora_chegada=chegada, data_hora_chamada=chegada, data_hora_fim=chegada,
+                    evolucao_consulta=' '.join(f.format(n=acaso.randint(1, 10)) for f in acaso.sample(EVOLUCOES, 2)),
+                    conduta_adotada=acaso.choice(CONDUTAS).format(n=acaso.randint(3, 30)),
+                    exame_outro_digitado=acaso.choice(EXAMES_OUTROS),
+                ))
+            FilaAtendimento.objects.bulk_create(lote)
+            criados += len(lote)
+        self.stdout.write(f"Semeado: {len(pacientes)} pacientes, {criados} atendimentos em {time.perf_counter() - inicio:.1f} s")
+
+        # bulk_create não dispara o post_save: os vetores vão em lote, como no reindexar_busca.
+        inicio = time.perf_counter()
+        for modelo in (Paciente, FilaAtendimento):
+            linhas = list(modelo.objects.filter(unidade=unidade).order_by('pk'))
+            for i in range(0, len(linhas), 1000):
+                atualizar_vetores_em_lote(linhas[i:i + 1000])
+        self.stdout.write(f"Vetores preenchidos em {time.perf_counter() - inicio:.1f} s")
+
+        with connection.cursor() as cursor: # Estatísticas em dia para o planejador escolher os índices.
+            cursor.execute(f'ANALYZE {Paciente._meta.db_table}, {FilaAtendimento._meta.db_table}')
+        return medicos
+
+    def _limpar(self, unidade, sufixo):
+        FilaAtendimento.objects.filter(unidade=unidade).delete()
+        Paciente.objects.filter(unidade=unidade).delete()
+        Medico.objects.filter(unidade=unidade).delete()
+        User.objects.filter(username__startswith=f'med_{sufixo}_').delete()
+        unidade.delete()
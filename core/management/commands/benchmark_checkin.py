@@ -0,0 +1,116 @@
+# core/management/commands/benchmark_checkin.py
+# Benchmark do quiosque: simula o pico da abertura, com muitos check-ins ao mesmo tempo.
+# Cria uma unidade temporária (médicos, pacientes e um usuário de totem), dispara os check-ins
+# em paralelo pela API de verdade (Client do Django: middleware, sessão, view e banco) e mostra
+# vazão, latências e se alguma entrada saiu duplicada. Cada paciente é enviado DUAS vezes,
+# em threads diferentes, para simular o duplo toque na tela.
+#
+# Uso: python manage.py benchmark_checkin --pacientes 300 --concorrencia 30
+# Rode contra o Postgres (o SQLite trava o arquivo inteiro a cada escrita e não mede nada útil).
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from core.models import EventoFila, FilaAtendimento, Lotacao, Medico, Paciente, Unidade
+
+
+class Command(BaseCommand):
+    help = 'Mede a API de check-in do quiosque sob uma rajada de check-ins concorrentes (e confere duplicidade).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=300, help='Pacientes diferentes fazendo check-in. Padrão: 300.')
+        parser.add_argument('--concorrencia', type=int, default=30, help='Requisições simultâneas. Padrão: 30.')
+        parser.add_argument('--medicos', type=int, default=5, help='Médicos da especialidade na unidade. Padrão: 5.')
+        parser.add_argument('--manter', action='store_true', help='Não apaga os dados criados no final.')
+
+    def handle(self, *args, **options):
+        sufixo = uuid.uuid4().hex[:6]
+        unidade, usuario = self._preparar(sufixo, options['pacientes'], options['medicos'])
+        try:
+            url = reverse('api_quiosque_checkin')
+            # Cada paciente duas vezes, intercalado, para os pares caírem em threads diferentes.
+            sus = [f'B{sufixo}{i:06d}' for i in range(options['pacientes'])]
+            envios = sus + sus
+
+            # O Client usa 'testserver' como host por padrão; uso um host aceito pelo ALLOWED_HOSTS.
+            host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+            def enviar(carteira_sus):
+                # Com a checagem de CSRF ligada, como no totem de verdade: o Client do Django pula o CSRF
+                # por padrão. O cookie vem da página de login (que tem {% csrf_token %}) e o token vai no cabeçalho.
+                cliente = Client(HTTP_HOST=host, enforce_csrf_checks=True)
+                cliente.force_login(usuario)
+                cliente.get(reverse('login'))
+                token = cliente.cookies[settings.CSRF_COOKIE_NAME].value
+                inicio = time.perf_counter()
+                resposta = cliente.post(url, {'carteira_sus': carteira_sus, 'especialidade': 'Clínica Geral'},
+                                        HTTP_X_CSRFTOKEN=token)
+                duracao = time.perf_counter() - inicio
+                connection.close() # Cada thread fecha a sua conexão com o banco.
+                return resposta.status_code, duracao
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concorrencia']) as executor:
+                resultados = list(executor.map(enviar, envios))
+            total = time.perf_counter() - inicio
+
+            latencias = sorted(d * 1000 for _, d in resultados)
+            codigos = {}
+            for codigo, _ in resultados:
+                codigos[codigo] = codigos.get(codigo, 0) + 1
+            duplicados = (
+                FilaAtendimento.objects.filter(unidade=unidade)
+                .values('paciente_id').annotate(n=Count('pk')).filter(n__gt=1).count()
+            )
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{len(envios)} check-ins ({options['pacientes']} pacientes x 2), concorrência {options['concorrencia']}"
+            ))
+            self.stdout.write(f"  vazão:      {len(envios) / total:8.1f} req/s  (total {total:.2f} s)")
+            self.stdout.write(f"  latência:   p50 {statistics.median(latencias):.1f} ms   "
+                              f"p95 {latencias[int(len(latencias) * 0.95) - 1]:.1f} ms   "
+                              f"p99 {latencias[int(len(latencias) * 0.99) - 1]:.1f} ms   máx {latencias[-1]:.1f} ms")
+            self.stdout.write(f"  respostas:  {codigos}  (201 = entrou na fila, 200 = já estava, 403 = CSRF/permissão)")
+            estilo = self.style.SUCCESS if duplicados == 0 else self.style.ERROR
+            self.stdout.write(estilo(f"  pacientes com entrada duplicada: {duplicados}"))
+        finally:
+            if not options['manter']:
+                self._limpar(unidade, sufixo)
+
+    def _preparar(self, sufixo, n_pacientes, n_medicos):
+        unidade = Unidade.objects.create(nome=f'Benchmark {sufixo}', sigla=f'B{sufixo}')
+        grupo, _ = Group.objects.get_or_create(name='Quiosques')
+        usuario = User.objects.create_user(f'totem_{sufixo}')
+        usuario.groups.add(grupo)
+        Lotacao.objects.create(user=usuario, unidade=unidade)
+        for i in range(n_medicos):
+            Medico.objects.create(
+                user=User.objects.create_user(f'med_{sufixo}_{i}'), unidade=unidade,
+                especialidade='Clínica Geral', crm=f'B{sufixo}{i}',
+            )
+        Paciente.objects.bulk_create([
+            Paciente(unidade=unidade, nome_completo=f'Paciente {i}', data_nascimento='1980-01-01',
+                     nome_mae='Mãe', carteira_sus=f'B{sufixo}{i:06d}')
+            for i in range(n_pacientes)
+        ])
+        return unidade, usuario
+
+    # Apago tudo o que o benchmark criou (os eventos também: são dados de teste).
+    def _limpar(self, unidade, sufixo):
+        EventoFila.objects.filter(unidade=unidade).delete()
+        FilaAtendimento.objects.filter(unidade=unidade).delete()
+        Paciente.objects.filter(unidade=unidade).delete()
+        Medico.objects.filter(unidade=unidade).delete()
+        Lotacao.objects.filter(unidade=unidade).delete()
+        User.objects.filter(username__endswith=sufixo).delete()
+        User.objects.filter(username__startswith=f'med_{sufixo}_').delete()
+        unidade.delete()
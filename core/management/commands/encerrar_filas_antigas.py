@@ -0,0 +1,77 @@
+# core/management/commands/encerrar_filas_antigas.py
+# Varredura de fim de dia: encerra entradas que ficaram "penduradas" na fila ativa.
+#   - AGUARDANDO há mais tempo que o corte -> CANCELADO (paciente foi embora sem ser chamado);
+#   - EM_ATENDIMENTO há mais tempo que o corte -> ATENDIDO (médico esqueceu de finalizar).
+# Roda unidade por unidade e em lotes, cada lote na sua própria transação curta
+# (transições em lote de core/transicoes.py: um UPDATE + um INSERT de eventos por lote).
+#
+# Uso:
+#   python manage.py encerrar_filas_antigas --dry-run          # só mostra o que seria feito
+#   python manage.py encerrar_filas_antigas --horas 12 --lote 500
+# Agendamento sugerido (cron, todo dia às 23h):
+#   0 23 * * * cd /caminho/do/projeto && python manage.py encerrar_filas_antigas
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from core import transicoes
+from core.models import FilaAtendimento, Unidade
+
+# Para cada status "ativo": a transição em lote que encerra e o nome para o relatório.
+ENCERRAMENTOS = [
+    ('AGUARDANDO', transicoes.cancelar_em_lote, 'cancelado(s)'),
+    ('EM_ATENDIMENTO', transicoes.finalizar_em_lote, 'finalizado(s)'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Encerra entradas AGUARDANDO/EM_ATENDIMENTO mais antigas que o corte, em lotes (use --dry-run para só ver o relatório).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=12, help='Idade mínima (horas desde a chegada) para encerrar. Padrão: 12.')
+        parser.add_argument('--lote', type=int, default=500, help='Quantas entradas por transação. Padrão: 500.')
+        parser.add_argument('--unidade', type=int, help='Só esta unidade (id). Padrão: todas.')
+        parser.add_argument('--dry-run', action='store_true', help='Não altera nada, só mostra o relatório.')
+
+    def handle(self, *args, **options):
+        if options['horas'] < 1 or options['lote'] < 1:
+            raise CommandError('--horas e --lote precisam ser maiores que zero.')
+
+        corte = timezone.now() - timedelta(hours=options['horas'])
+        unidades = Unidade.objects.order_by('pk')
+        if options['unidade']:
+            unidades = unidades.filter(pk=options['unidade'])
+
+        self.stdout.write(f"Corte: chegada antes de {timezone.localtime(corte):%d/%m/%Y %H:%M}" +
+                          (" (DRY-RUN, nada será alterado)" if options['dry_run'] else ""))
+        total_geral = 0
+        for unidade in unidades:
+            # Filtro sempre por unidade + status + chegada: usa o índice (unidade, status, data_hora_chegada).
+            antigas = FilaAtendimento.objects.filter(unidade=unidade, data_hora_chegada__lt=corte)
+            for status, transicao, descricao in ENCERRAMENTOS:
+                pendentes = antigas.filter(status=status)
+                if options['dry_run']:
+                    resumo = pendentes.aggregate(total=Count('pk'), mais_antiga=Min('data_hora_chegada'))
+                    if resumo['total']:
+                        self.stdout.write(
+                            f"  [{unidade.sigla}] {resumo['total']} {status} seriam {descricao} "
+                            f"(mais antiga: {timezone.localtime(resumo['mais_antiga']):%d/%m %H:%M})"
+                        )
+                        total_geral += resumo['total']
+                    continue
+
+                encerradas = 0
+                while True:
+                    ids = list(pendentes.order_by('pk').values_list('pk', flat=True)[:options['lote']])
+                    if not ids:
+                        break
+                    # Só o status selecionado: se alguém chamou o paciente depois do SELECT acima,
+                    # a trava da transição vê EM_ATENDIMENTO e não cancela essa entrada.
+                    encerradas += transicao(unidade, ids, status_permitidos=[status], motivo='varredura_fim_do_dia')
+                    self.stdout.write(f"  [{unidade.sigla}] {status}: {encerradas} {descricao} até agora...")
+                total_geral += encerradas
+
+        verbo = 'seriam encerradas' if options['dry_run'] else 'encerradas'
+        self.stdout.write(self.style.SUCCESS(f"Total: {total_geral} entrada(s) {verbo}."))
@@ -0,0 +1,120 @@
+# core/management/commands/gerar_documentos.py
+# Gera de uma vez os documentos para imprimir (pedido de exames e resumo, ver core/documentos.py)
+# de todos os atendimentos ATENDIDOS de um dia, e opcionalmente só de uma unidade ou de um médico,
+# e junta tudo em um arquivo .zip (uma pasta por médico).
+#
+# A renderização é dividida entre vários processos (ProcessPoolExecutor): cada processo recebe pedaços
+# da lista de ids, busca os atendimentos com uma query por pedaço e renderiza os templates; o processo
+# principal só escreve o .zip. O trabalho dos filhos fica em core/documentos_processos.py, que funciona
+# com qualquer método de início de processo (fork, spawn ou forkserver). Documento que não mudou desde a última renderização vem do cache.
+# Para o cache valer entre processos e entre uma execução e outra, o cache do Django precisa ser
+# compartilhado (ex: DJANGO_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache no
+# settings_producao, ou Redis/Memcached). Com o LocMemCache padrão cada processo tem o seu.
+#
+# Uso:
+#   python manage.py gerar_documentos                                   # hoje, todas as unidades
+#   python manage.py gerar_documentos --data 2025-06-02 --medico 7 --saida dr7.zip
+#   python manage.py gerar_documentos --processos 8 --tipos resumo --replica
+import os
+import time
+import zipfile
+from contextlib import nullcontext
+from datetime import datetime, time as hora, timedelta
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.documentos import TIPOS_DOCUMENTO
+from core.documentos_processos import iniciar_processo, renderizar_pedaco
+from core.models import FilaAtendimento
+from gestor_filas.db_router import ler_da_replica
+
+
+# Fecho as conexões E os pools (settings.py, OPTIONS['pool']) antes de criar os processos. Com "fork"
+# (padrão no Linux até o Python 3.13) o filho herdaria o pool do pai, que fica no atributo de classe
+# DatabaseWrapper._connection_pools, com os sockets abertos, e pai e filhos usariam as mesmas conexões
+# com o Postgres ao mesmo tempo. Com "spawn"/"forkserver" o filho não herda nada e isto só custa
+# reabrir a conexão do pai. connections.close_all() só devolve a conexão ao pool, sem fechar o socket.
+# Só fecho pool que já existe: a propriedade `pool` do Django cria um novo se ainda não houver.
+def _fechar_conexoes_antes_do_fork():
+    connections.close_all()
+    for conexao in connections.all():
+        if conexao.alias in getattr(conexao, '_connection_pools', {}):
+            conexao.close_pool()
+
+
+class Command(BaseCommand):
+    help = 'Gera em paralelo os pedidos de exames e resumos dos atendimentos de um dia, em um arquivo .zip.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Dia da chegada (AAAA-MM-DD). Padrão: hoje.')
+        parser.add_argument('--unidade', type=int, help='Só esta unidade (id).')
+        parser.add_argument('--medico', type=int, help='Só este médico (id).')
+        parser.add_argument('--tipos', default=','.join(TIPOS_DOCUMENTO), help=f"Separados por vírgula. Padrão: {','.join(TIPOS_DOCUMENTO)}.")
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 2, help='Processos renderizando em paralelo (1 = sem paralelismo). Padrão: nº de CPUs.')
+        parser.add_argument('--pedaco', type=int, default=100, help='Atendimentos por tarefa de cada processo. Padrão: 100.')
+        parser.add_argument('--saida', help='Arquivo .zip de saída. Padrão: documentos_AAAA-MM-DD.zip.')
+        parser.add_argument('--replica', action='store_true', help='Lê os atendimentos da réplica de leitura (se configurada).')
+
+    def handle(self, *args, **options):
+        try:
+            dia = parse_date(options['data']) if options['data'] else timezone.localdate()
+        except ValueError:
+            dia = None
+        if dia is None:
+            raise CommandError('--data precisa estar no formato AAAA-MM-DD.')
+        tipos = [t.strip() for t in options['tipos'].split(',') if t.strip()]
+        if not tipos or any(t not in TIPOS_DOCUMENTO for t in tipos):
+            raise CommandError(f"--tipos aceita: {', '.join(TIPOS_DOCUMENTO)}.")
+        if options['processos'] < 1 or options['pedaco'] < 1:
+            raise CommandError('--processos e --pedaco precisam ser maiores que zero.')
+
+        # Só os ids no processo principal; os filhos buscam os dados completos, pedaço por pedaço.
+        inicio_dia = timezone.make_aware(datetime.combine(dia, hora.min))
+        atendimentos = FilaAtendimento.objects.filter(
+            status='ATENDIDO', data_hora_chegada__gte=inicio_dia, data_hora_chegada__lt=inicio_dia + timedelta(days=1),
+        )
+        if options['unidade']:
+            atendimentos = atendimentos.filter(unidade_id=options['unidade'])
+        if options['medico']:
+            atendimentos = atendimentos.filter(medico_destino_id=options['medico'])
+        with ler_da_replica() if options['replica'] else nullcontext():
+            ids = list(atendimentos.order_by('pk').values_list('pk', flat=True))
+        if not ids:
+            self.stdout.write(f"Nenhum atendimento ATENDIDO em {dia:%d/%m/%Y} com esses filtros.")
+            return
+
+        pedacos = [ids[i:i + options['pedaco']] for i in range(0, len(ids), options['pedaco'])]
+        saida = options['saida'] or f'documentos_{dia.isoformat()}.zip'
+        inicio = time.perf_counter()
+        total, do_cache = 0, 0
+
+        with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+            if options['processos'] == 1:
+                resultados = map(renderizar_pedaco, pedacos, repeat(tipos), repeat(options['replica']))
+                executor = None
+            else:
+                # Cada filho abre a sua própria conexão (e o seu próprio pool); o pai reabre na próxima query.
+                _fechar_conexoes_antes_do_fork()
+                executor = ProcessPoolExecutor(max_workers=options['processos'], initializer=iniciar_processo)
+                resultados = executor.map(renderizar_pedaco, pedacos, repeat(tipos), repeat(options['replica']))
+            try:
+                for numero, documentos in enumerate(resultados, start=1):
+                    for nome, html, veio_do_cache in documentos:
+                        arquivo_zip.writestr(nome, html)
+                        total += 1
+                        do_cache += veio_do_cache
+                    self.stdout.write(f"  pedaço {numero}/{len(pedacos)}: {total} documento(s) até agora...")
+            finally:
+                if executor:
+                    executor.shutdown()
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} documento(s) de {len(ids)} atendimento(s) em {duracao:.1f} s "
+            f"({do_cache} do cache, {total - do_cache} renderizado(s)) -> {saida} ({os.path.getsize(saida) / 1024:.0f} KB)"
+        ))
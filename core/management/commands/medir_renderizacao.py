@@ -0,0 +1,162 @@
+# core/management/commands/medir_renderizacao.py
+# Comando para medir o "antes e depois" do perfil de produção (gestor_filas/settings_producao.py):
+# - tempo de renderização dos templates mais pesados, sem e com cached loader + cache de fragmentos;
+# - bytes transferidos dos estáticos, sem compressão e com as versões .gz/.br que o collectstatic gera.
+#
+# Uso: python manage.py medir_renderizacao --repeticoes 200
+# Não precisa de banco: os objetos do contexto são instâncias não salvas dos modelos.
+import gzip
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from core.models import FilaAtendimento, Medico, Paciente
+
+try:
+    import brotli # Opcional: só para mostrar o tamanho da versão .br.
+except ImportError:
+    brotli = None
+
+# Os templates que mais pesam no dia a dia (e que têm mais comentários para o parser atravessar).
+TEMPLATES_MEDIDOS = ['home.html', 'atendente_painel.html', 'medico_painel.html']
+
+# Mesma lista usada pela AtendimentoDetailView, para a grade de exames ter o tamanho real.
+EXAMES = [
+    "Hemograma Completo", "Glicose em Jejum", "TTOG", "HbA1C", "Frutosamina",
+    "Insulina", "Ureia", "Creatinina", "Ácido Úrico", "Triglicerídeos",
+    "HDL-C", "Colesterol Total", "Colesterol Não HDL-C", "TGO/AST", "Cálcio",
+    "Bilirrubina Total e Frações", "Fosfatase Alcalina", "GGT", "Transferrina",
+    "Ferro", "Ferritina", "Vitamina B12", "Homocisteína", "Vitamina D",
+    "Magnésio", "Potássio", "Fósforo", "TSH", "T3 e T4 Livre", "Sódio"
+]
+
+
+class Command(BaseCommand):
+    help = 'Mede tempo de renderização dos templates e bytes dos estáticos, antes e depois do perfil de produção.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=200, help='Quantas renderizações por template (padrão: 200).')
+
+    def handle(self, *args, **options):
+        repeticoes = options['repeticoes']
+        contexto = self._contexto_falso()
+
+        # "Antes": loaders sem cache e cache de fragmentos desligado (DummyCache).
+        antes = self._backend(cacheado=False)
+        # "Depois": cached loader e cache de fragmentos em memória, como no settings_producao.
+        depois = self._backend(cacheado=True)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Renderização ({repeticoes} repetições por template)'))
+        for nome in TEMPLATES_MEDIDOS:
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                ms_antes, html_antes = self._medir(antes, nome, contexto, repeticoes)
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                       'LOCATION': 'medir-renderizacao'}}):
+                ms_depois, html_depois = self._medir(depois, nome, contexto, repeticoes)
+
+            self.stdout.write(
+                f'  {nome:<24} antes: {ms_antes:7.3f} ms/req   depois: {ms_depois:7.3f} ms/req   '
+                f'({ms_antes / ms_depois:4.1f}x)   HTML: {len(html_depois.encode()):6d} B '
+                f'(gzip: {len(gzip.compress(html_depois.encode())):5d} B)'
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Estáticos (bytes transferidos por arquivo)'))
+        for caminho in ['css/custom.css']:
+            arquivo = finders.find(caminho)
+            with open(arquivo, 'rb') as f:
+                conteudo = f.read()
+            linha = f'  {caminho:<24} original: {len(conteudo):6d} B   gzip: {len(gzip.compress(conteudo, 9)):6d} B'
+            if brotli:
+                linha += f'   brotli: {len(brotli.compress(conteudo)):6d} B'
+            else:
+                linha += '   brotli: (pacote Brotli não instalado)'
+            self.stdout.write(linha)
+        self.stdout.write('  (Bootstrap e Font Awesome vêm de CDN, que já entrega comprimido e com cache longo.)')
+        self.stdout.write('  Com nome com hash, visitas seguintes não baixam nada: o navegador usa o cache "immutable".')
+
+    # Monto um backend de templates igual ao do settings, só trocando os loaders.
+    def _backend(self, cacheado):
+        loaders = [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]
+        if cacheado:
+            loaders = [('django.template.loaders.cached.Loader', loaders)]
+        return DjangoTemplates({
+            'NAME': 'medicao-cacheado' if cacheado else 'medicao-sem-cache',
+            'DIRS': settings.TEMPLATES[0]['DIRS'],
+            'APP_DIRS': False,
+            'OPTIONS': {'loaders': loaders, 'debug': False},
+        })
+
+    # Cada repetição faz get_template + render, como uma requisição faria.
+    def _medir(self, backend, nome, contexto, repeticoes):
+        request = contexto['request']
+        html = backend.get_template(nome).render(contexto, request) # Aquecimento (e o HTML para medir tamanho).
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            backend.get_template(nome).render(contexto, request)
+        total = time.perf_counter() - inicio
+        return total * 1000 / repeticoes, html
+
+    # Contexto com objetos não salvos, cobrindo as variáveis que os três templates usam.
+    def _contexto_falso(self):
+        agora = timezone.now()
+        user = User(pk=1, username='medico1', first_name='Ana', last_name='Souza')
+        medico = Medico(pk=1, user=user, especialidade='Clínica Geral', crm='12345')
+        paciente = Paciente(pk=1, nome_completo='Maria da Silva', data_nascimento=agora.date(),
+                            nome_mae='Joana da Silva', carteira_sus='700000000000001')
+        fila = [
+            FilaAtendimento(pk=i, paciente=paciente, medico_destino=medico, status='AGUARDANDO', data_hora_chegada=agora)
+            for i in range(1, 6)
+        ]
+        atendimento = fila[0]
+        page_obj = Paginator(fila, 5).page(1)
+
+        # Barra lateral do atendente: uma unidade típica, com 8 médicos e contadores da fila de cada um
+        # (como AtendentePainelView.get_context_data monta a partir de contagem_fila_por_medico).
+        medicos = [medico] + [
+            Medico(pk=i, user=User(pk=i, username=f'medico{i}', first_name=f'Médico {i}', last_name='Teste'),
+                   especialidade='Clínica Geral', crm=f'{10000 + i}')
+            for i in range(2, 9)
+        ]
+        medicos_resumo = [
+            {'medico': m, 'aguardando': i * 2, 'em_atendimento': i % 2,
+             'chegada_mais_antiga': agora - timedelta(minutes=15 * i) if i else None}
+            for i, m in enumerate(medicos)
+        ]
+        fila_geral_resumo = {
+            'aguardando': sum(r['aguardando'] for r in medicos_resumo) + 3,
+            'em_atendimento': sum(r['em_atendimento'] for r in medicos_resumo),
+            'chegada_mais_antiga': agora - timedelta(minutes=120),
+        }
+
+        request = RequestFactory().get('/')
+        request.user = user
+
+        return {
+            'request': request,
+            'user': user,
+            # home.html
+            'is_medico': True, 'is_atendente': False,
+            'mensagem_boas_vindas': 'Bem-vindo(a)!', 'sub_mensagem': 'Resumo da fila.',
+            'pacientes_em_atendimento_count': 0, 'pacientes_aguardando_count': len(fila),
+            'proximo_atendimento_obj': atendimento, 'acao_proximo_atendimento': 'Iniciar Próximo Atendimento',
+            # atendente_painel.html
+            'medicos': medicos, 'medicos_resumo': medicos_resumo, 'fila_geral_resumo': fila_geral_resumo,
+            'medico_selecionado': None,
+            'fila_list': fila, 'page_obj': page_obj, 'is_paginated': False,
+            # medico_painel.html
+            'atendimento': atendimento, 'paciente': paciente, 'fila_do_medico': fila[1:],
+            'exames_disponiveis': EXAMES, 'selecionados_checkbox_salvos': EXAMES[:3],
+            'outro_digitado_salvo': '', 'evolucao_consulta_salva': '', 'conduta_adotada_salva': '',
+        }
@@ -0,0 +1,46 @@
+# core/management/commands/reindexar_busca.py
+# Preenche (ou refaz) o vetor da busca textual de atendimentos e pacientes (ver core/busca.py).
+# O post_save já mantém os vetores em dia; este comando é para as linhas que existiam antes da
+# busca, ou para refazer tudo depois de mudar os campos/pesos indexados (--todos).
+# Percorre a tabela por pk em lotes; cada lote é um UPDATE só (atualizar_vetores_em_lote).
+#
+# Uso:
+#   python manage.py reindexar_busca                 # só as linhas ainda sem vetor
+#   python manage.py reindexar_busca --todos --lote 1000
+from django.core.management.base import BaseCommand, CommandError
+
+from core.busca import CAMPOS_POR_MODELO, atualizar_vetores_em_lote, busca_disponivel
+from core.models import FilaAtendimento, Paciente
+
+
+class Command(BaseCommand):
+    help = 'Preenche o vetor da busca textual de atendimentos e pacientes, em lotes (use --todos para refazer tudo).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Quantas linhas por UPDATE. Padrão: 500.')
+        parser.add_argument('--unidade', type=int, help='Só esta unidade (id). Padrão: todas.')
+        parser.add_argument('--todos', action='store_true', help='Refaz também as linhas que já têm vetor.')
+
+    def handle(self, *args, **options):
+        if not busca_disponivel():
+            raise CommandError('A busca textual precisa do PostgreSQL.')
+        if options['lote'] < 1:
+            raise CommandError('--lote precisa ser maior que zero.')
+
+        for modelo in (Paciente, FilaAtendimento):
+            linhas = modelo.objects.only('pk', *[campo for campo, _ in CAMPOS_POR_MODELO[modelo]]).order_by('pk')
+            if options['unidade']:
+                linhas = linhas.filter(unidade_id=options['unidade'])
+            if not options['todos']:
+                linhas = linhas.filter(busca_vetor__isnull=True)
+
+            # Paginação por pk (keyset): cada lote começa depois do último pk do anterior, sem OFFSET.
+            ultimo_pk, total = 0, 0
+            while True:
+                lote = list(linhas.filter(pk__gt=ultimo_pk)[:options['lote']])
+                if not lote:
+                    break
+                total += atualizar_vetores_em_lote(lote)
+                ultimo_pk = lote[-1].pk
+                self.stdout.write(f"  {modelo._meta.verbose_name_plural}: {total} reindexado(s) até agora...")
+            self.stdout.write(self.style.SUCCESS(f"{modelo._meta.verbose_name_plural}: {total} reindexado(s)."))
@@ -0,0 +1,74 @@
+# core/management/commands/testar_senhas.py
+# Carga na emissão de senhas (core/senhas.py) contra o banco configurado: várias threads, cada uma
+# com a sua conexão, pedem senhas do mesmo prefixo ao mesmo tempo, em uma unidade temporária, e o
+# comando mostra a vazão (senhas/s), conferindo de passagem que nenhum número saiu repetido.
+# O teste automático da corrida é o SenhasConcorrenciaTests (core/tests.py); este comando serve
+# para medir com mais threads/senhas, ou no banco de produção, fora da suíte de testes.
+# Inclui a corrida da "primeira senha do dia" (todas as threads começam sem a linha do contador existir).
+#
+# Uso: python manage.py testar_senhas --threads 20 --por-thread 50
+# Rode contra o Postgres: o SQLite trava o arquivo inteiro a cada escrita e não testa a concorrência de verdade.
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import SequenciaSenha, Unidade
+from core.senhas import proximo_numero
+
+PREFIXO_TESTE = 'TST'
+
+
+class Command(BaseCommand):
+    help = 'Emite senhas em paralelo em uma unidade temporária e confere que nenhum número se repete.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=20, help='Threads pedindo senha ao mesmo tempo. Padrão: 20.')
+        parser.add_argument('--por-thread', type=int, default=50, help='Senhas por thread. Padrão: 50.')
+
+    def handle(self, *args, **options):
+        sufixo = uuid.uuid4().hex[:6]
+        unidade = Unidade.objects.create(nome=f'Teste senhas {sufixo}', sigla=f'S{sufixo}')
+        numeros, erros = [], []
+        trava_lista = threading.Lock()
+        largada = threading.Barrier(options['threads']) # Todas começam juntas, para forçar a corrida.
+
+        def trabalhar():
+            try:
+                largada.wait()
+                meus = [proximo_numero(unidade.pk, PREFIXO_TESTE) for _ in range(options['por_thread'])]
+                with trava_lista:
+                    numeros.extend(meus)
+            except Exception as e:
+                erros.append(e)
+            finally:
+                connection.close() # Cada thread fecha a sua conexão com o banco.
+
+        try:
+            threads = [threading.Thread(target=trabalhar) for _ in range(options['threads'])]
+            inicio = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            total_tempo = time.perf_counter() - inicio
+
+            esperado = options['threads'] * options['por_thread']
+            repetidos = {n: c for n, c in Counter(numeros).items() if c > 1}
+            contador = SequenciaSenha.objects.get(unidade=unidade, prefixo=PREFIXO_TESTE).ultimo_numero
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{esperado} senhas pedidas ({options['threads']} threads x {options['por_thread']})"
+            ))
+            self.stdout.write(f"  emitidas:   {len(numeros)}  em {total_tempo:.2f} s  ({len(numeros) / total_tempo:.0f} senhas/s)")
+            self.stdout.write(f"  contador:   {contador}")
+            self.stdout.write(f"  erros:      {len(erros)}" + (f"  (primeiro: {erros[0]!r})" if erros else ''))
+            if erros or repetidos or len(numeros) != esperado or contador != esperado:
+                raise CommandError(f"Falhou: {len(repetidos)} número(s) repetido(s), ex: {list(repetidos)[:5]}.")
+            self.stdout.write(self.style.SUCCESS("  OK: nenhum número repetido, contador igual ao total emitido."))
+        finally:
+            SequenciaSenha.objects.filter(unidade=unidade).delete()
+            unidade.delete()
@@ -3,17 +3,50 @@ from django.db import models
 from django.contrib.auth.models import User #Importo o User padrão do Django para o Medico
 from django.utils import timezone #Para usar como default em campos de data/hora
 from django.db.models import JSONField #Para armazenar listas/dicionários de forma flexível (ex: exames)
+from django.db.models.functions import Now #Hora do banco, para o criado_em dos eventos da fila
+from django.contrib.postgres.indexes import GinIndex #Índice para a busca textual (tsvector)
+from django.contrib.postgres.search import SearchVectorField #tsvector do Postgres, para a busca nas anotações clínicas
+
+# Modelo Unidade: cada clínica/posto da rede que usa o mesmo sistema.
+# Pacientes, médicos e filas pertencem a uma unidade, e todas as consultas das views
+# são filtradas por ela (assim a fila de uma unidade pequena não "sente" o tamanho da rede).
+class Unidade(models.Model):
+    nome = models.CharField(max_length=150, unique=True, verbose_name='Nome da Unidade') # Ex: UBS Centro, Clínica Vila Nova
+    sigla = models.CharField(max_length=10, unique=True, verbose_name='Sigla') # Nome curto, para telas e relatórios
+
+    class Meta:
+        verbose_name = 'Unidade'
+        verbose_name_plural = 'Unidades'
+        ordering = ['nome']
+
+    def __str__(self):
+        return self.nome
+
+# Modelo Lotacao: liga um usuário que NÃO é médico (atendente, por exemplo) à sua unidade.
+# O médico já tem a unidade no próprio modelo Medico.
+class Lotacao(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='lotacao') # Um usuário trabalha em uma unidade.
+    unidade = models.ForeignKey(Unidade, on_delete=models.PROTECT, related_name='lotacoes', verbose_name='Unidade') # PROTECT: não deixo apagar unidade com gente lotada nela.
+
+    class Meta:
+        verbose_name = 'Lotação'
+        verbose_name_plural = 'Lotações'
+
+    def __str__(self):
+        return f'{self.user.username} ({self.unidade})'
 
 #Modelo Paciente: aqui guardo todas as informações do paciente.
 #Tanto dados cadastrais básicos quanto informações clínicas que podem ser preenchidas
 #pelo médico durante o atendimento.
 class Paciente(models.Model):
+    unidade = models.ForeignKey(Unidade, on_delete=models.PROTECT, related_name='pacientes', verbose_name='Unidade') # Unidade onde o paciente foi cadastrado.
+
     # Dados Cadastrais Básicos
     nome_completo = models.CharField(max_length=255, verbose_name='Nome Completo') # Nome completo do paciente
     data_nascimento = models.DateField(verbose_name='Data de Nascimento') # Data de nascimento
     idade = models.IntegerField(blank=True, null=True, verbose_name='Idade') # Idade, pode ser calculada ou preenchida. blank/null=True porque pode ser opcional ou calculada depois.
     nome_mae = models.CharField(max_length=255, verbose_name='Nome da Mãe') # Nome da mãe, importante para identificação
-    carteira_sus = models.CharField(max_length=20, unique=True, verbose_name='Carteira do SUS') # Número do SUS, deve ser único
+    carteira_sus = models.CharField(max_length=20, verbose_name='Carteira do SUS') # Número do SUS, único dentro da unidade (ver constraints no Meta)
     plano_saude = models.CharField(max_length=100, blank=True, null=True, verbose_name='Plano de Saúde') # Plano de saúde, se tiver (opcional)
 
     # Informações Clínicas - geralmente preenchidas pelo médico
@@ -26,6 +59,23 @@ class Paciente(models.Model):
     alergias = models.TextField(blank=True, null=True, verbose_name='Alergias') # Lista de alergias conhecidas
     doencas_pre_existentes = models.TextField(blank=True, null=True, verbose_name='Doenças Pre-existentes') # Outras doenças que o paciente já possui
 
+    # Vetor da busca textual dos campos clínicos acima. Preenchido no post_save (ver core/busca.py), nunca pelo formulário.
+    busca_vetor = SearchVectorField(null=True, editable=False)
+
+    # Quando os dados pessoais foram apagados a pedido do paciente (LGPD, ver core/privacidade.py). Nulo = dados normais.
+    anonimizado_em = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Anonimizado em')
+
+    class Meta:
+        constraints = [
+            # Cada unidade tem o seu cadastro; o mesmo SUS não pode aparecer duas vezes na mesma unidade.
+            # O índice desta constraint já começa pela unidade, então a busca exata por SUS usa ele.
+            models.UniqueConstraint(fields=['unidade', 'carteira_sus'], name='paciente_unidade_sus_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['unidade', 'nome_completo'], name='paciente_unid_nome_idx'), # Listagem ordenada por nome dentro da unidade.
+            GinIndex(fields=['busca_vetor'], name='paciente_busca_gin'), # Busca textual nos dados clínicos.
+        ]
+
     # Representação em string do objeto Paciente. Facilita na visualização no admin e em debugs.
     def __str__(self):
         return self.nome_completo
@@ -34,6 +84,7 @@ class Paciente(models.Model):
 # Está ligado ao User do Django para autenticação e permissões.
 class Medico(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE) # Relacionamento um-para-um com o User. Se o User for deletado, o Medico também é.
+    unidade = models.ForeignKey(Unidade, on_delete=models.PROTECT, related_name='medicos', verbose_name='Unidade') # Unidade onde o médico atende.
     especialidade = models.CharField(max_length=100, verbose_name='Especialidade') # Ex: Cardiologia, Clínica Geral
     crm = models.CharField(max_length=20, unique=True, verbose_name='CRM') # CRM do médico, deve ser único
     telefone = models.CharField(max_length=20, blank=True, null=True, verbose_name='Telefone') # Contato telefônico (opcional)
@@ -57,6 +108,7 @@ class FilaAtendimento(models.Model):
     ]
 
     # Relacionamentos e dados básicos da fila
+    unidade = models.ForeignKey(Unidade, on_delete=models.PROTECT, related_name='filas', verbose_name='Unidade') # Unidade da fila. Fica também aqui (e não só no médico) para os índices começarem por ela.
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, verbose_name='Paciente') # Qual paciente está na fila. Se o paciente for deletado, a entrada na fila também é.
     medico_destino = models.ForeignKey(Medico, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Médico de Destino') # Para qual médico o paciente foi encaminhado. SET_NULL para não perder o histórico da fila se o médico for deletado.
     status = models.CharField(max_length=20, choices=STATUS_FILA, default='AGUARDANDO', verbose_name='Status') # Status atual do paciente na fila.
@@ -64,6 +116,7 @@ class FilaAtendimento(models.Model):
     data_hora_chamada = models.DateTimeField(null=True, blank=True, verbose_name='Hora da Chamada') # Quando o paciente foi chamado para atendimento (opcional).
     data_hora_fim = models.DateTimeField(null=True, blank=True, verbose_name='Hora do Fim') # Quando o atendimento foi finalizado (opcional).
     observacoes = models.TextField(blank=True, null=True, verbose_name='Observações (Atendente)') # Observações adicionadas pelo atendente ao colocar na fila.
+    senha = models.CharField(max_length=15, blank=True, default='', verbose_name='Senha') # Senha impressa do dia, ex: "CLI-042" (ver core/senhas.py). Vazia nas entradas antigas.
 
     # Campos para dados do atendimento (preenchidos pelo médico)
     # Usar JSONField aqui é uma boa porque a lista de exames pode variar muito, e não quero criar uma tabela separada só para isso
@@ -74,13 +127,108 @@ class FilaAtendimento(models.Model):
     evolucao_consulta = models.TextField(blank=True, null=True, verbose_name="Evolução da Consulta") # Notas do médico sobre a evolução do paciente durante a consulta.
     conduta_adotada = models.TextField(blank=True, null=True, verbose_name="Conduta Adotada") # O que o médico decidiu fazer (receitas, encaminhamentos, etc.).
 
+    # Vetor da busca textual de evolução, conduta e outro exame. Preenchido no post_save (ver core/busca.py).
+    busca_vetor = SearchVectorField(null=True, editable=False)
+
     # Meta informações do modelo.
     class Meta:
         verbose_name = 'Entrada na Fila' # Nome amigável para um único objeto no admin.
         verbose_name_plural = 'Fila de Atendimento' # Nome amigável para múltiplos objetos no admin.
         ordering = ['data_hora_chegada'] # Por padrão, ordenar as entradas na fila pela hora de chegada.
+        # Índices compostos começando pela unidade: as consultas "quentes" da fila só
+        # percorrem as linhas da própria unidade, não importa quantas outras unidades existam no banco.
+        indexes = [
+            models.Index(fields=['unidade', 'status', 'data_hora_chegada'], name='fila_unid_status_cheg_idx'), # Fila geral da unidade.
+            models.Index(fields=['unidade', 'medico_destino', 'status', 'data_hora_chegada'], name='fila_unid_med_status_idx'), # Fila de um médico (painel e polling).
+            GinIndex(fields=['busca_vetor'], name='fila_busca_gin'), # Busca textual nas anotações do médico.
+        ]
 
     # Representação em string do objeto FilaAtendimento.
     def __str__(self):
         return f"{self.paciente.nome_completo} - {self.get_status_display()} ({self.data_hora_chegada.strftime('%d/%m %H:%M')})"
-        # Usei get_status_display() para pegar o valor "human-readable" do status.
\ No newline at end of file
+        # Usei get_status_display() para pegar o valor "human-readable" do status.
+
+
+# Modelo EventoFila: log "somente inclusão" (append-only) de tudo que acontece com a fila.
+# Cada transição (entrou, chamado, finalizado, cancelado, reatribuído) grava um evento
+# NA MESMA TRANSAÇÃO da mudança na FilaAtendimento (ver core/transicoes.py). Assim, quem
+# precisa reagir às mudanças (caches, telas ao vivo, relatórios, auditoria) lê os eventos
+# a partir de um cursor (ver core/eventos.py), em vez de ficar consultando a fila inteira.
+class EventoFila(models.Model):
+    TIPOS_EVENTO = [
+        ('ENFILEIRADO', 'Entrou na fila'),
+        ('CHAMADO', 'Chamado'),
+        ('FINALIZADO', 'Finalizado'),
+        ('CANCELADO', 'Cancelado'),
+        ('REATRIBUIDO', 'Reatribuído a outro médico'),
+    ]
+
+    unidade = models.ForeignKey(Unidade, on_delete=models.PROTECT, related_name='eventos_fila', verbose_name='Unidade')
+    # fila e medico sem constraint no banco (db_constraint=False, DO_NOTHING): o log nunca é alterado,
+    # nem quando a entrada da fila ou o médico forem apagados. O id fica guardado como histórico.
+    fila = models.ForeignKey(FilaAtendimento, on_delete=models.DO_NOTHING, db_constraint=False, related_name='eventos', verbose_name='Entrada na Fila')
+    medico = models.ForeignKey(Medico, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+', verbose_name='Médico (após o evento)')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Usuário') # Quem fez a ação (None = sistema).
+    tipo = models.CharField(max_length=20, choices=TIPOS_EVENTO, verbose_name='Tipo')
+    status_anterior = models.CharField(max_length=20, blank=True, verbose_name='Status Anterior') # Vazio no ENFILEIRADO.
+    status_novo = models.CharField(max_length=20, verbose_name='Status Novo')
+    # Relógio do banco, não do servidor da aplicação: é com ele que core/eventos.py mede a idade do evento.
+    criado_em = models.DateTimeField(db_default=Now(), verbose_name='Criado em')
+    dados = JSONField(default=dict, blank=True, verbose_name='Dados Extras') # Ex: {'medico_anterior_id': 3} na reatribuição.
+
+    class Meta:
+        verbose_name = 'Evento da Fila'
+        verbose_name_plural = 'Eventos da Fila'
+        ordering = ['id'] # O id é o cursor: sempre crescente.
+        indexes = [
+            models.Index(fields=['unidade', 'id'], name='evento_unid_id_idx'), # Consumidores que leem só uma unidade.
+        ]
+
+    # Append-only: só deixo inserir. Alterar ou apagar um evento é erro de programação.
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("EventoFila é somente inclusão; eventos não podem ser alterados.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("EventoFila é somente inclusão; eventos não podem ser apagados.")
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_tipo_display()} (fila {self.fila_id})"
+
+
+# Modelo CursorConsumidor: até onde cada consumidor do log de eventos já leu.
+# Um consumidor é identificado por um nome fixo (ex: 'cache-painel', 'relatorio-diario').
+class CursorConsumidor(models.Model):
+    nome = models.CharField(max_length=100, unique=True, verbose_name='Consumidor')
+    ultimo_evento_id = models.BigIntegerField(default=0, verbose_name='Último Evento Processado')
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'Cursor de Consumidor'
+        verbose_name_plural = 'Cursores de Consumidores'
+
+    def __str__(self):
+        return f"{self.nome} (até o evento {self.ultimo_evento_id})"
+
+
+# Modelo SequenciaSenha: contador das senhas do dia (ex: CLI-001, CLI-002...) por unidade e prefixo.
+# Uma linha por (unidade, prefixo, dia); cada senha nova é um UPDATE ultimo_numero = ultimo_numero + 1
+# nessa linha (ver core/senhas.py). Trava só essa linha, e por um instante, em vez de calcular
+# MAX()+1 na fila (o que obrigaria a serializar todas as entradas da unidade).
+# Começa do zero a cada dia porque o dia faz parte da chave; as linhas antigas podem ser apagadas à vontade.
+class SequenciaSenha(models.Model):
+    unidade = models.ForeignKey(Unidade, on_delete=models.CASCADE, related_name='sequencias_senha', verbose_name='Unidade')
+    prefixo = models.CharField(max_length=10, verbose_name='Prefixo') # Ex: CLI (Clínica Geral), CAR (Cardiologia).
+    data = models.DateField(verbose_name='Dia')
+    ultimo_numero = models.PositiveIntegerField(default=0, verbose_name='Último Número Emitido')
+
+    class Meta:
+        verbose_name = 'Sequência de Senhas'
+        verbose_name_plural = 'Sequências de Senhas'
+        constraints = [
+            models.UniqueConstraint(fields=['unidade', 'prefixo', 'data'], name='sequencia_senha_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.prefixo} {self.data:%d/%m/%Y} (até {self.ultimo_numero})"
@@ -0,0 +1,161 @@
+# core/privacidade.py
+# Pedidos de privacidade (LGPD): anonimizar ou excluir pacientes, em lotes.
+#
+# Anonimizar: apaga o que identifica o paciente (nome, mãe, SUS, plano, data de nascimento vira só o ano,
+# textos livres) e mantém as entradas da fila (datas, status, médico, exames marcados) para as estatísticas.
+# Os textos livres das entradas (observações, evolução, conduta, outro exame) também são apagados,
+# porque é neles que costuma aparecer nome, endereço, telefone...
+# Excluir: apaga as entradas da fila e depois o paciente.
+#
+# Nenhuma das duas passa pelo "collector" do Django carregando o histórico inteiro em memória:
+#   1. as entradas da fila são limpas/apagadas em lotes de tamanho fixo, cada lote um UPDATE/DELETE
+#      curto (por pk), então nenhuma trava fica presa por muito tempo;
+#   2. só então o lote de pacientes é travado, conferido e anonimizado/excluído, em uma transação curta.
+# As duas operações podem ser repetidas: paciente já anonimizado (anonimizado_em) ou já excluído é ignorado,
+# então um comando interrompido continua de onde parou.
+# Paciente com entrada ativa na fila (aguardando ou em atendimento) é pulado: não mexo em quem está no salão.
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, Q, Value
+from django.db.models.functions import Cast, Concat, TruncYear
+from django.utils import timezone
+
+from .models import FilaAtendimento, Paciente
+from .unidades import chave_cache, invalidar_cache
+
+STATUS_ATIVOS = ('AGUARDANDO', 'EM_ATENDIMENTO')
+
+# Textos livres que são apagados na anonimização.
+CAMPOS_TEXTO_PACIENTE = [
+    'plano_saude', 'queixa_principal', 'inicio_doenca', 'localizacao_dor',
+    'caracteristicas_dor', 'evolucao_quadro', 'alergias', 'doencas_pre_existentes',
+]
+CAMPOS_TEXTO_FILA = ['observacoes', 'exame_outro_digitado', 'evolucao_consulta', 'conduta_adotada']
+
+LOTE_ATENDIMENTOS_PADRAO = 1000
+
+
+# Entradas da fila que ainda têm algum texto livre: assim a retomada não reprocessa o que já foi limpo.
+def _com_texto():
+    filtro = Q()
+    for campo in CAMPOS_TEXTO_FILA:
+        filtro |= Q(**{f'{campo}__isnull': False})
+    return filtro
+
+
+def _com_entrada_ativa(ids_pacientes):
+    return set(
+        FilaAtendimento.objects.filter(paciente_id__in=ids_pacientes, status__in=STATUS_ATIVOS)
+        .values_list('paciente_id', flat=True)
+    )
+
+
+# Caches afetados (busca por SUS do quiosque e contadores da barra lateral), limpos depois do COMMIT.
+def _limpar_caches(linhas):
+    chaves = [chave_cache(linha['unidade_id'], f"sus:{linha['carteira_sus']}") for linha in linhas]
+    unidades = {linha['unidade_id'] for linha in linhas}
+
+    def limpar():
+        cache.delete_many(chaves)
+        for unidade_id in unidades:
+            invalidar_cache(unidade_id, 'contagem_fila')
+    transaction.on_commit(limpar)
+
+
+# Passo 1: entradas da fila dos pacientes, em lotes de no máximo `lote` linhas. Cada lote é um
+# UPDATE (ou DELETE) por pk, fora de transação longa. Retorna o total de entradas alteradas.
+def _processar_atendimentos(ids_pacientes, excluir, lote):
+    pendentes = FilaAtendimento.objects.filter(paciente_id__in=ids_pacientes).order_by('pk')
+    if not excluir:
+        pendentes = pendentes.filter(_com_texto())
+
+    total = 0
+    while True:
+        ids = list(pendentes.values_list('pk', flat=True)[:lote])
+        if not ids:
+            return total
+        alvo = FilaAtendimento.objects.filter(pk__in=ids)
+        if excluir:
+            # Sem signals de delete na FilaAtendimento e com o log de eventos em DO_NOTHING, o Django
+            # faz isto como um DELETE ... WHERE id IN (...) direto, sem carregar as linhas.
+            total += alvo.delete()[0]
+        else:
+            total += alvo.update(busca_vetor=None, **{campo: None for campo in CAMPOS_TEXTO_FILA})
+
+
+# Anonimiza um lote de pacientes. Retorna (pacientes anonimizados, entradas da fila limpas, pulados por estarem na fila).
+def anonimizar_lote(ids_pacientes, lote_atendimentos=LOTE_ATENDIMENTOS_PADRAO):
+    ids = set(Paciente.objects.filter(pk__in=ids_pacientes, anonimizado_em__isnull=True).values_list('pk', flat=True))
+    ids -= _com_entrada_ativa(ids)
+    atendimentos = _processar_atendimentos(ids, False, lote_atendimentos)
+
+    with transaction.atomic():
+        # Trava o lote e confere de novo: alguém pode ter entrado na fila enquanto o passo 1 rodava.
+        linhas = list(
+            Paciente.objects.select_for_update().filter(pk__in=ids, anonimizado_em__isnull=True)
+            .values('pk', 'unidade_id', 'carteira_sus')
+        )
+        ativos = _com_entrada_ativa([linha['pk'] for linha in linhas])
+        linhas = [linha for linha in linhas if linha['pk'] not in ativos]
+        ids_finais = [linha['pk'] for linha in linhas]
+
+        # Sobra do passo 1 (anotação salva no meio do caminho): normalmente nenhuma linha.
+        atendimentos += FilaAtendimento.objects.filter(_com_texto(), paciente_id__in=ids_finais).update(
+            busca_vetor=None, **{campo: None for campo in CAMPOS_TEXTO_FILA},
+        )
+        anonimizados = Paciente.objects.filter(pk__in=ids_finais).update(
+            nome_completo='Paciente anonimizado',
+            nome_mae='',
+            carteira_sus=Concat(Value('ANON'), Cast('pk', CharField())), # Continua único na unidade.
+            data_nascimento=TruncYear('data_nascimento'), # Fica só o ano (01/01/AAAA), que basta para as estatísticas.
+            busca_vetor=None,
+            anonimizado_em=timezone.now(),
+            **{campo: None for campo in CAMPOS_TEXTO_PACIENTE},
+        )
+        _limpar_caches(linhas)
+    return anonimizados, atendimentos, len(set(ids_pacientes)) - anonimizados
+
+
+# Exclui um lote de pacientes e todo o histórico deles na fila.
+# Retorna (pacientes excluídos, entradas da fila excluídas, pulados por estarem na fila ou por não existirem mais).
+def excluir_lote(ids_pacientes, lote_atendimentos=LOTE_ATENDIMENTOS_PADRAO):
+    excluidos, atendimentos, nao_encontrados, na_fila = excluir_lote_detalhado(ids_pacientes, lote_atendimentos)
+    return excluidos, atendimentos, len(nao_encontrados) + len(na_fila)
+
+
+# O mesmo que excluir_lote, mas com os ids pulados separados pelo motivo, para quem precisa dizer
+# ao usuário por que um paciente não foi excluído (ex: PacienteDeleteView).
+# Retorna (pacientes excluídos, entradas da fila excluídas, ids que não existem mais, ids que estão na fila).
+def excluir_lote_detalhado(ids_pacientes, lote_atendimentos=LOTE_ATENDIMENTOS_PADRAO):
+    ids = set(Paciente.objects.filter(pk__in=ids_pacientes).values_list('pk', flat=True))
+    na_fila = _com_entrada_ativa(ids)
+    ids -= na_fila
+    atendimentos = _processar_atendimentos(ids, True, lote_atendimentos)
+
+    with transaction.atomic():
+        linhas = list(Paciente.objects.select_for_update().filter(pk__in=ids).values('pk', 'unidade_id', 'carteira_sus'))
+        ativos = _com_entrada_ativa([linha['pk'] for linha in linhas])
+        na_fila |= ativos # Entrou na fila depois da primeira conferência.
+        linhas = [linha for linha in linhas if linha['pk'] not in ativos]
+        ids_finais = [linha['pk'] for linha in linhas]
+
+        atendimentos += FilaAtendimento.objects.filter(paciente_id__in=ids_finais).delete()[0]
+        # Aqui o histórico já foi apagado: o collector do Django só carrega os pacientes do lote.
+        excluidos = Paciente.objects.filter(pk__in=ids_finais).delete()[1].get(Paciente._meta.label, 0)
+        _limpar_caches(linhas)
+    nao_encontrados = set(ids_pacientes) - set(ids_finais) - na_fila
+    return excluidos, atendimentos, nao_encontrados, na_fila
+
+
+# Percorre uma lista (possivelmente grande) de ids em lotes de pacientes, chamando `progresso`
+# a cada lote com o número do lote e os totais acumulados. Usado pelo comando e pela ação do admin.
+def processar_em_lotes(ids_pacientes, excluir=False, lote=200, lote_atendimentos=LOTE_ATENDIMENTOS_PADRAO, progresso=None):
+    funcao = excluir_lote if excluir else anonimizar_lote
+    ids_pacientes = sorted(set(ids_pacientes))
+    totais = [0, 0, 0]
+    for numero, inicio in enumerate(range(0, len(ids_pacientes), lote), start=1):
+        resultado = funcao(ids_pacientes[inicio:inicio + lote], lote_atendimentos)
+        totais = [t + r for t, r in zip(totais, resultado)]
+        if progresso:
+            progresso(numero, *totais)
+    return tuple(totais)
@@ -0,0 +1,59 @@
+# core/senhas.py
+# Senhas impressas do dia ("CLI-042"), para chamar o paciente no salão sem depender só do nome.
+# Cada especialidade tem o seu prefixo e a sua numeração, por unidade, recomeçando todo dia.
+#
+# Como o número é emitido: uma linha de contador por (unidade, prefixo, dia) em SequenciaSenha,
+# incrementada com UPDATE ... SET ultimo_numero = ultimo_numero + 1 (F() no Django). O banco
+# trava só essa linha, só até o fim da transação curta do incremento. Nada de MAX()+1 na fila:
+# duas entradas simultâneas leriam o mesmo máximo, e evitar isso exigiria travar a fila inteira.
+#
+# Buracos na numeração são aceitos: uma senha emitida para uma entrada que depois falha (ou é
+# cancelada) simplesmente não é reaproveitada. O que nunca acontece é a mesma senha sair duas vezes.
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .busca import sem_acento
+from .models import SequenciaSenha
+
+# Prefixo de quem entra na fila sem médico definido (fila geral).
+PREFIXO_GERAL = 'GER'
+
+
+# "Clínica Geral" -> "CLI", "Cardiologia" -> "CAR", "Ortopedia e Traumatologia" -> "ORT".
+# Três primeiras letras da especialidade, sem acento e em maiúsculas.
+def prefixo_da_senha(medico):
+    if medico is None:
+        return PREFIXO_GERAL
+    letras = [c for c in sem_acento(medico.especialidade).upper() if c.isalnum()]
+    return ''.join(letras[:3]) or PREFIXO_GERAL
+
+
+def formatar_senha(prefixo, numero):
+    return f'{prefixo}-{numero:03d}'
+
+
+# Próximo número do contador (unidade, prefixo, dia). O UPDATE e a leitura do valor ficam na mesma
+# transação: a linha continua travada por nós entre os dois, então o valor lido é o que NÓS gravamos.
+# Primeira senha do dia: a linha ainda não existe e é criada com 1. Se duas requisições tentarem criar
+# ao mesmo tempo, a UniqueConstraint barra a segunda, que volta e incrementa a linha criada pela primeira.
+@transaction.atomic
+def proximo_numero(unidade_id, prefixo, data=None):
+    data = data or timezone.localdate()
+    contador = SequenciaSenha.objects.filter(unidade_id=unidade_id, prefixo=prefixo, data=data)
+    for _ in range(2):
+        if contador.update(ultimo_numero=F('ultimo_numero') + 1):
+            return contador.values_list('ultimo_numero', flat=True).get()
+        try:
+            with transaction.atomic(): # Savepoint: a falha do INSERT não derruba a transação de fora.
+                SequenciaSenha.objects.create(unidade_id=unidade_id, prefixo=prefixo, data=data, ultimo_numero=1)
+            return 1
+        except IntegrityError:
+            continue # Outra requisição criou a linha primeiro; na volta do laço o UPDATE acha ela.
+    raise RuntimeError(f"Não consegui emitir senha para {prefixo} na unidade {unidade_id}.")
+
+
+# Senha completa para uma entrada nova na fila do médico (ou da fila geral, se medico for None).
+def emitir_senha(unidade_id, medico=None):
+    prefixo = prefixo_da_senha(medico)
+    return formatar_senha(prefixo, proximo_numero(unidade_id, prefixo))
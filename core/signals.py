@@ -0,0 +1,61 @@
+# core/signals.py
+# Receivers que mantêm os caches por unidade em dia.
+# São conectados no CoreConfig.ready() (core/apps.py).
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .busca import CAMPOS_FILA, CAMPOS_PACIENTE, atualizar_vetor
+from .models import FilaAtendimento, Medico, Paciente
+from .unidades import invalidar_cache
+
+
+# Médico criado, alterado ou removido: a lista de médicos da unidade muda.
+@receiver(post_save, sender=Medico)
+@receiver(post_delete, sender=Medico)
+def medico_alterado(sender, instance, **kwargs):
+    invalidar_cache(instance.unidade_id, 'medicos')
+
+
+# O nome exibido na barra lateral vem do User; se ele mudar, limpo o cache da unidade do médico.
+# Save com update_fields que não mexe no nome (ex: o last_login gravado a cada login) não consulta nada.
+CAMPOS_NOME_USUARIO = {'first_name', 'last_name', 'username'}
+
+
+@receiver(post_save, sender=User)
+def usuario_alterado(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_NOME_USUARIO.intersection(update_fields):
+        return
+    medico = Medico.objects.filter(user=instance).only('unidade_id').first()
+    if medico:
+        invalidar_cache(medico.unidade_id, 'medicos')
+
+
+# Paciente alterado ou removido: limpo a busca por SUS do quiosque.
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def paciente_alterado(sender, instance, **kwargs):
+    invalidar_cache(instance.unidade_id, f'sus:{instance.carteira_sus}')
+
+
+# Anotações do atendimento ou dados clínicos do paciente salvos: recalculo o vetor da busca textual.
+# Quando o save() diz quais campos mudou (update_fields) e nenhum deles é indexado, pulo o UPDATE.
+# É o caso das transições da fila (chamar, finalizar...), que só mexem em status e horários.
+# Linha recém-criada sem nenhum texto indexado (entrada nova na fila, cadastro sem dados clínicos)
+# também não precisa de UPDATE: vetor nulo simplesmente não aparece na busca.
+def _precisa_reindexar(instance, created, update_fields, campos):
+    if created:
+        return any(getattr(instance, campo) for campo, _ in campos)
+    return update_fields is None or any(campo in update_fields for campo, _ in campos)
+
+
+@receiver(post_save, sender=FilaAtendimento)
+def atendimento_salvo(sender, instance, created, update_fields=None, **kwargs):
+    if _precisa_reindexar(instance, created, update_fields, CAMPOS_FILA):
+        atualizar_vetor(instance)
+
+
+@receiver(post_save, sender=Paciente)
+def paciente_salvo_busca(sender, instance, created, update_fields=None, **kwargs):
+    if _precisa_reindexar(instance, created, update_fields, CAMPOS_PACIENTE):
+        atualizar_vetor(instance)
@@ -1,3 +1,341 @@
-from django.test import TestCase
+# core/tests.py
+# Testes automáticos do core. Rodar com: python manage.py test core
+import threading
+import time
+import warnings
+from collections import Counter
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import JsonResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import path, reverse
+from django.views import View
+
+from gestor_filas.db_router import ler_da_replica
+
+from . import privacidade, transicoes
+from .busca import buscar_atendimentos
+
+from .eventos import consumir, eventos_desde
+from .models import CursorConsumidor, EventoFila, FilaAtendimento, Lotacao, Medico, Paciente, SequenciaSenha, Unidade
+from .senhas import PREFIXO_GERAL, emitir_senha, proximo_numero
+
+
+# View só de leitura para os testes da réplica: responde quantas unidades o banco lido "enxerga".
+# O POST não grava nada, mas é uma requisição de escrita para o middleware (fixa a sessão no primário).
+class ContagemUnidadesView(View):
+    usar_replica = True
+
+    def get(self, request):
+        return JsonResponse({'unidades': Unidade.objects.count()})
+
+    def post(self, request):
+        return JsonResponse({'ok': True})
+
+
+urlpatterns = [
+    path('contagem/', ContagemUnidadesView.as_view()),
+]
+
+REPLICA_TESTE = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+
+
+# Roteamento primário/réplica (gestor_filas/db_router.py e gestor_filas/middleware.py) com dois bancos
+# separados de verdade: o 'default' de teste e um SQLite em memória no papel de 'replica'.
+# No settings a réplica de teste espelha o 'default' (TEST MIRROR), e aí não dá para ver de onde a
+# leitura veio. Aqui cada banco tem um número diferente de unidades, e a contagem diz quem respondeu.
+@override_settings(ROOT_URLCONF='core.tests', REPLICA_DB_ALIAS='replica', REPLICA_JANELA_PRIMARIO=10)
+class RoteamentoReplicaTests(TestCase):
+
+    def setUp(self):
+        # O Django avisa que sobrescrever DATABASES é arriscado: aqui só acrescento o alias da réplica,
+        # e a conexão dele é criada à mão logo abaixo.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            sobrescrita = override_settings(DATABASES={**settings.DATABASES, 'replica': dict(REPLICA_TESTE)})
+            sobrescrita.enable()
+        self.addCleanup(sobrescrita.disable)
+
+        conexao = DatabaseWrapper(connections.configure_settings(settings.DATABASES)['replica'], 'replica')
+        connections['replica'] = conexao # Alias que não existia quando o Django montou as conexões.
+        self.addCleanup(self._fechar_replica)
+
+        with conexao.schema_editor() as editor:
+            editor.create_model(Unidade)
+        Unidade.objects.using('replica').create(nome='Só na réplica 1', sigla='R1')
+        Unidade.objects.using('replica').create(nome='Só na réplica 2', sigla='R2')
+        Unidade.objects.create(nome='Só no primário', sigla='P1')
+
+    def _fechar_replica(self):
+        conexao = connections['replica']
+        if conexao.connection is not None:
+            conexao.connection.close() # close() do Django não fecha SQLite em memória.
+        del connections['replica']
+
+    def test_get_em_view_so_leitura_le_da_replica(self):
+        resposta = self.client.get('/contagem/')
+        self.assertEqual(resposta.json()['unidades'], 2)
+
+    def test_depois_de_um_post_a_sessao_le_do_primario_pela_janela(self):
+        agora = time.time()
+        with mock.patch('gestor_filas.middleware.time.time', return_value=agora):
+            self.client.post('/contagem/')
+            self.assertEqual(self.client.get('/contagem/').json()['unidades'], 1)
+        with mock.patch('gestor_filas.middleware.time.time', return_value=agora + settings.REPLICA_JANELA_PRIMARIO - 1):
+            self.assertEqual(self.client.get('/contagem/').json()['unidades'], 1)
+        with mock.patch('gestor_filas.middleware.time.time', return_value=agora + settings.REPLICA_JANELA_PRIMARIO + 1):
+            self.assertEqual(self.client.get('/contagem/').json()['unidades'], 2)
+
+    def test_ler_da_replica_so_vale_dentro_do_bloco(self):
+        self.assertEqual(Unidade.objects.count(), 1)
+        with ler_da_replica():
+            self.assertEqual(Unidade.objects.count(), 2)
+        self.assertEqual(Unidade.objects.count(), 1)
+
+
+# Emissão de senhas (core/senhas.py) com várias threads ao mesmo tempo, cada uma com a sua conexão.
+# Só no PostgreSQL: o SQLite trava o arquivo inteiro a cada escrita, então não há corrida para testar.
+# TransactionTestCase porque cada thread precisa ver o que as outras já gravaram (COMMIT de verdade).
+@skipUnless(connection.vendor == 'postgresql', 'Concorrência das senhas só é testada no PostgreSQL.')
+class SenhasConcorrenciaTests(TransactionTestCase):
+    THREADS = 16
+    POR_THREAD = 25
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome='Unidade Senhas', sigla='SEN')
+
+    # Roda `funcao` em THREADS threads que largam juntas; devolve tudo o que elas retornaram.
+    def _em_paralelo(self, funcao):
+        resultados, erros = [], []
+        trava = threading.Lock()
+        largada = threading.Barrier(self.THREADS)
+
+        def trabalhar():
+            try:
+                largada.wait()
+                meus = funcao()
+                with trava:
+                    resultados.extend(meus)
+            except Exception as e:
+                erros.append(e)
+            finally:
+                connection.close() # Cada thread fecha a sua conexão com o banco.
+
+        threads = [threading.Thread(target=trabalhar) for _ in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(erros, [])
+        return resultados
+
+    def _contador(self, prefixo):
+        return SequenciaSenha.objects.get(unidade=self.unidade, prefixo=prefixo).ultimo_numero
+
+    # Todas as threads pedem a primeira senha do dia sem a linha do contador existir:
+    # só um INSERT pode ganhar, e os outros têm que cair no UPDATE da linha criada.
+    def test_corrida_da_primeira_senha_do_dia(self):
+        numeros = self._em_paralelo(lambda: [proximo_numero(self.unidade.pk, 'TST')])
+        self.assertEqual(sorted(numeros), list(range(1, self.THREADS + 1)))
+        self.assertEqual(self._contador('TST'), self.THREADS)
+
+    def test_nenhuma_senha_repetida(self):
+        senhas = self._em_paralelo(lambda: [emitir_senha(self.unidade.pk) for _ in range(self.POR_THREAD)])
+        total = self.THREADS * self.POR_THREAD
+        self.assertEqual(len(senhas), total)
+        self.assertEqual([s for s, n in Counter(senhas).items() if n > 1], [])
+        self.assertEqual(self._contador(PREFIXO_GERAL), total)
+
+
+# Cursor do log de eventos (core/eventos.py): ids seguidos saem na hora; um buraco nos ids segura o
+# cursor até o evento depois dele ficar mais velho que EVENTOS_ATRASO_SEGURANCA.
+@override_settings(EVENTOS_ATRASO_SEGURANCA=3600)
+class EventosCursorTests(TestCase):
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome='Unidade Eventos', sigla='EVT')
+        self.outra = Unidade.objects.create(nome='Outra Unidade', sigla='OUT')
+        self.primeiro = self._evento().pk
+
+    def _evento(self, unidade=None, pk=None):
+        return EventoFila.objects.create(
+            pk=pk, unidade=unidade or self.unidade, fila_id=1, tipo='CHAMADO', status_novo='EM_ATENDIMENTO',
+        )
+
+    def test_ids_seguidos_sao_entregues_sem_esperar_o_atraso(self):
+        segundo = self._evento().pk
+        eventos, cursor = eventos_desde(self.primeiro - 1)
+        self.assertEqual([e.pk for e in eventos], [self.primeiro, segundo])
+        self.assertEqual(cursor, segundo)
+
+    def test_buraco_recente_segura_o_cursor_ate_passar_o_atraso(self):
+        depois_do_buraco = self._evento(pk=self.primeiro + 2).pk # O id do meio "ainda não fez commit".
+        eventos, cursor = eventos_desde(self.primeiro - 1)
+        self.assertEqual([e.pk for e in eventos], [self.primeiro])
+        self.assertEqual(eventos_desde(cursor), ([], cursor))
+        with override_settings(EVENTOS_ATRASO_SEGURANCA=0):
+            eventos, cursor = eventos_desde(cursor)
+        self.assertEqual([e.pk for e in eventos], [depois_do_buraco])
+
+    def test_consumidor_de_uma_unidade_anda_sobre_os_eventos_das_outras(self):
+        CursorConsumidor.objects.create(nome='painel', ultimo_evento_id=self.primeiro - 1)
+        de_outra = [self._evento(self.outra).pk for _ in range(3)]
+        recebidos = []
+        self.assertEqual(consumir('painel', recebidos.extend, unidade_id=self.unidade.pk), 1)
+        self.assertEqual([e.pk for e in recebidos], [self.primeiro])
+        self.assertEqual(CursorConsumidor.objects.get(nome='painel').ultimo_evento_id, de_outra[-1])
+
+
+# Varredura de fim de dia (encerrar_filas_antigas): a transição em lote confere, já com a linha
+# travada, o mesmo status que a varredura selecionou.
+class EncerrarFilasAntigasTests(TestCase):
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome='Unidade Varredura', sigla='VAR')
+        paciente = Paciente.objects.create(
+            unidade=self.unidade, nome_completo='Paciente Antigo', data_nascimento=date(1990, 1, 1),
+            nome_mae='Mãe', carteira_sus='700000000000001',
+        )
+        self.item = FilaAtendimento.objects.create(
+            unidade=self.unidade, paciente=paciente, data_hora_chegada=timezone.now() - timedelta(hours=20),
+        )
+
+    def test_entrada_chamada_entre_o_select_e_a_trava_nao_e_cancelada(self):
+        original = transicoes._transicao_em_lote
+
+        # O médico chama o paciente logo depois de a varredura ter lido os ids AGUARDANDO.
+        def chamado_no_meio(unidade, ids, *args, **kwargs):
+            if args[1] == 'CANCELADO':
+                FilaAtendimento.objects.filter(pk=self.item.pk).update(status='EM_ATENDIMENTO', data_hora_chamada=timezone.now())
+            return original(unidade, ids, *args, **kwargs)
+
+        with mock.patch.object(transicoes, '_transicao_em_lote', chamado_no_meio):
+            call_command('encerrar_filas_antigas', stdout=StringIO())
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.status, 'ATENDIDO') # Encerrado como EM_ATENDIMENTO, não cancelado.
+        self.assertEqual(list(EventoFila.objects.filter(fila_id=self.item.pk).values_list('tipo', flat=True)), ['FINALIZADO'])
+
+
+# Busca textual (core/busca.py): radical do português + acentos. Só no PostgreSQL (tsvector).
+@skipUnless(connection.vendor == 'postgresql', 'A busca textual só existe no PostgreSQL.')
+class BuscaTextualTests(TestCase):
+
+    def setUp(self):
+        unidade = Unidade.objects.create(nome='Unidade Busca', sigla='BUS')
+        usuario = User.objects.create_user('medico_busca', password='x')
+        self.medico = Medico.objects.create(user=usuario, unidade=unidade, especialidade='Clínica Geral', crm='CRM-BUSCA')
+        paciente = Paciente.objects.create(
+            unidade=unidade, nome_completo='Paciente Busca', data_nascimento=date(1980, 1, 1),
+            nome_mae='Mãe', carteira_sus='700000000000002',
+        )
+        # O post_save (core/signals.py) monta o busca_vetor.
+        self.item = FilaAtendimento.objects.create(
+            unidade=unidade, paciente=paciente, medico_destino=self.medico, status='ATENDIDO',
+            evolucao_consulta='Duas internações no último ano por hipertensão. Refere cefaléia.',
+        )
+
+    def _acha(self, termos):
+        return list(buscar_atendimentos(self.medico, termos).values_list('pk', flat=True)) == [self.item.pk]
+
+    def test_radical_acha_outras_formas_da_palavra(self):
+        self.assertTrue(self._acha('internado'))
+        self.assertTrue(self._acha('internação')) # Singular acha o plural do texto.
+
+    def test_busca_sem_acento(self):
+        self.assertTrue(self._acha('internacoes'))
+        self.assertTrue(self._acha('cefaleia'))
+        self.assertTrue(self._acha('hipertensao'))
+
+    def test_termo_que_nao_esta_no_texto(self):
+        self.assertFalse(self._acha('diabetes'))
+
+
+# Painel do atendente: o número de queries não pode crescer com o número de médicos da unidade
+# (nada de uma query por médico no resumo da fila).
+class PainelAtendenteQueriesTests(TestCase):
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome='Unidade Painel', sigla='PNL')
+        atendente = User.objects.create_user('atendente_painel', password='x')
+        atendente.groups.add(Group.objects.get_or_create(name='Atendentes')[0])
+        Lotacao.objects.create(user=atendente, unidade=self.unidade)
+        self.client.force_login(atendente)
+        self.medicos = 0
+        self._novo_medico()
+
+    # Médico com um paciente em atendimento e dois aguardando.
+    def _novo_medico(self):
+        self.medicos += 1
+        n = self.medicos
+        usuario = User.objects.create(username=f'medico_painel_{n}', first_name=f'Médico {n}')
+        medico = Medico.objects.create(user=usuario, unidade=self.unidade, especialidade='Clínica Geral', crm=f'CRM-PNL-{n}')
+        for i, status in enumerate(['EM_ATENDIMENTO', 'AGUARDANDO', 'AGUARDANDO']):
+            paciente = Paciente.objects.create(
+                unidade=self.unidade, nome_completo=f'Paciente {n}-{i}', data_nascimento=date(1990, 1, 1),
+                nome_mae='Mãe', carteira_sus=f'8{n:07d}{i:07d}',
+            )
+            FilaAtendimento.objects.create(unidade=self.unidade, paciente=paciente, medico_destino=medico, status=status)
+
+    def _renderizar(self):
+        cache.clear() # Mede o painel montado do banco, não o resumo que ficou no cache da unidade.
+        resposta = self.client.get(reverse('painel_atendente'))
+        self.assertEqual(resposta.status_code, 200)
+
+    def test_mesmo_numero_de_queries_com_poucos_e_muitos_medicos(self):
+        with CaptureQueriesContext(connection) as com_um_medico:
+            self._renderizar()
+        for _ in range(10):
+            self._novo_medico()
+        with self.assertNumQueries(len(com_um_medico)):
+            self._renderizar()
+
+
+# Exclusão de paciente pela tela (PacienteDeleteView): a mensagem diz por que nada foi excluído.
+class PacienteDeleteViewTests(TestCase):
+
+    def setUp(self):
+        self.unidade = Unidade.objects.create(nome='Unidade Exclusão', sigla='EXC')
+        atendente = User.objects.create(username='atendente_exclusao')
+        atendente.groups.add(Group.objects.get_or_create(name='Atendentes')[0])
+        Lotacao.objects.create(user=atendente, unidade=self.unidade)
+        self.client.force_login(atendente)
+        self.paciente = Paciente.objects.create(
+            unidade=self.unidade, nome_completo='Paciente Exclusão', data_nascimento=date(1970, 1, 1),
+            nome_mae='Mãe', carteira_sus='700000000000003',
+        )
+
+    def _excluir(self):
+        resposta = self.client.post(reverse('paciente_deletar', args=[self.paciente.pk]))
+        self.assertRedirects(resposta, reverse('paciente_list'), fetch_redirect_response=False)
+        return [str(m) for m in get_messages(resposta.wsgi_request)]
+
+    def test_exclui_paciente_fora_da_fila(self):
+        self.assertIn('excluído com sucesso', self._excluir()[0])
+        self.assertFalse(Paciente.objects.filter(pk=self.paciente.pk).exists())
+
+    def test_paciente_na_fila_nao_e_excluido(self):
+        FilaAtendimento.objects.create(unidade=self.unidade, paciente=self.paciente)
+        self.assertIn('está na fila', self._excluir()[0])
+        self.assertTrue(Paciente.objects.filter(pk=self.paciente.pk).exists())
+
+    def test_paciente_excluido_por_outro_atendente_no_meio(self):
+        original = privacidade.excluir_lote_detalhado
+
+        def excluido_antes(ids, *args, **kwargs):
+            Paciente.objects.filter(pk__in=ids).delete()
+            return original(ids, *args, **kwargs)
+
+        with mock.patch.object(privacidade, 'excluir_lote_detalhado', excluido_antes):
+            self.assertIn('não existe mais', self._excluir()[0])
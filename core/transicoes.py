@@ -0,0 +1,198 @@
+# core/transicoes.py
+# Todas as mudanças de estado da fila passam por aqui.
+# Cada função roda em uma transação, trava a linha da fila (select_for_update) para conferir o
+# status atual sem corrida com outro atendente/médico, aplica a mudança e grava o EventoFila
+# correspondente NA MESMA transação. Ou as duas coisas acontecem, ou nenhuma.
+from django.db import transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .eventos import registrar_evento, registrar_eventos_em_lote
+from .models import FilaAtendimento, Paciente
+from .senhas import emitir_senha
+from .unidades import invalidar_cache
+
+
+# Erro para transições que não fazem sentido no status atual (ex: chamar quem já foi atendido).
+# As views capturam e mostram uma mensagem amigável.
+class TransicaoInvalida(Exception):
+    def __init__(self, item_fila, mensagem):
+        super().__init__(mensagem)
+        self.item_fila = item_fila
+
+
+# Recarrego a linha travada, para decidir com base no status que está no banco agora.
+def _travar(item_fila):
+    return FilaAtendimento.objects.select_for_update().get(pk=item_fila.pk)
+
+
+# A fila da unidade mudou: limpo os contadores da barra lateral (unidades.contagem_fila_por_medico).
+# Só depois do COMMIT: antes disso, outra requisição poderia recalcular com os dados antigos e guardar de novo.
+def _fila_mudou(unidade_id):
+    transaction.on_commit(lambda: invalidar_cache(unidade_id, 'contagem_fila'))
+
+
+# Coloca um paciente na fila de um médico (status AGUARDANDO), com a senha do dia (core/senhas.py).
+# A senha é emitida ANTES de abrir a transação da entrada: chamada fora de transação (views), o
+# contador é liberado logo após o incremento e não espera o INSERT da fila e do evento. Se a entrada
+# falhar depois, aquele número fica sem uso (buraco aceito). Chamada de dentro de outra transação
+# (checkin), o incremento entra nela e o contador fica travado até o fim dela, que é curta.
+def enfileirar(paciente, unidade, medico=None, observacoes=None, usuario=None):
+    senha = emitir_senha(unidade.pk, medico)
+    with transaction.atomic():
+        item_fila = FilaAtendimento.objects.create(
+            unidade=unidade,
+            paciente=paciente,
+            medico_destino=medico,
+            observacoes=observacoes,
+            status='AGUARDANDO',
+            senha=senha,
+        )
+        registrar_evento(item_fila, 'ENFILEIRADO', usuario=usuario)
+        _fila_mudou(item_fila.unidade_id)
+    return item_fila
+
+
+# Check-in do quiosque: enfileira o paciente com um dos médicos candidatos (o médico escolhido,
+# ou todos da especialidade escolhida), a não ser que ele JÁ esteja ativo com um deles.
+# Travo a linha do Paciente: envios simultâneos do mesmo paciente (duplo toque, cartão lido duas vezes)
+# esperam um pelo outro no banco, e o segundo encontra a entrada criada pelo primeiro.
+# O SUS é conferido de novo na linha travada, porque o paciente_id pode ter vindo de um cache velho.
+# Retorna (item_fila, criado). Levanta Paciente.DoesNotExist se o id não bater com unidade + SUS.
+@transaction.atomic
+def checkin(paciente_id, carteira_sus, unidade, medicos_candidatos, usuario=None):
+    paciente = Paciente.objects.select_for_update().get(pk=paciente_id, unidade=unidade, carteira_sus=carteira_sus)
+    ids_candidatos = [medico.pk for medico in medicos_candidatos]
+
+    existente = FilaAtendimento.objects.filter(
+        unidade=unidade, paciente=paciente, medico_destino_id__in=ids_candidatos,
+        status__in=('AGUARDANDO', 'EM_ATENDIMENTO'),
+    ).select_related('medico_destino__user').first()
+    if existente:
+        return existente, False
+
+    # Entre os candidatos, o que tem menos gente aguardando (uma query agrupada só).
+    carga = dict(
+        FilaAtendimento.objects.filter(unidade=unidade, medico_destino_id__in=ids_candidatos, status='AGUARDANDO')
+        .values('medico_destino_id').annotate(total=Count('pk')).values_list('medico_destino_id', 'total')
+    )
+    medico = min(medicos_candidatos, key=lambda m: (carga.get(m.pk, 0), m.pk))
+    return enfileirar(paciente, unidade, medico=medico, usuario=usuario), True
+
+
+# AGUARDANDO -> EM_ATENDIMENTO.
+@transaction.atomic
+def chamar(item_fila, usuario=None):
+    item_fila = _travar(item_fila)
+    if item_fila.status != 'AGUARDANDO':
+        raise TransicaoInvalida(item_fila, "O paciente não estava aguardando.")
+    item_fila.status = 'EM_ATENDIMENTO'
+    item_fila.data_hora_chamada = timezone.now() # Registra a hora da chamada.
+    item_fila.save(update_fields=['status', 'data_hora_chamada'])
+    registrar_evento(item_fila, 'CHAMADO', status_anterior='AGUARDANDO', usuario=usuario)
+    _fila_mudou(item_fila.unidade_id)
+    return item_fila
+
+
+# AGUARDANDO ou EM_ATENDIMENTO -> ATENDIDO.
+# Se estava aguardando (médico finalizou direto), a hora da chamada também é preenchida.
+@transaction.atomic
+def finalizar(item_fila, usuario=None):
+    item_fila = _travar(item_fila)
+    status_anterior = item_fila.status
+    if status_anterior not in ('AGUARDANDO', 'EM_ATENDIMENTO'):
+        raise TransicaoInvalida(item_fila, "O atendimento não está ativo.")
+    agora = timezone.now()
+    item_fila.status = 'ATENDIDO'
+    if not item_fila.data_hora_chamada: # Se não foi chamado formalmente antes.
+        item_fila.data_hora_chamada = agora
+    item_fila.data_hora_fim = agora # Registra hora do fim.
+    item_fila.save(update_fields=['status', 'data_hora_chamada', 'data_hora_fim'])
+    registrar_evento(item_fila, 'FINALIZADO', status_anterior=status_anterior, usuario=usuario)
+    _fila_mudou(item_fila.unidade_id)
+    return item_fila
+
+
+# AGUARDANDO ou EM_ATENDIMENTO -> CANCELADO.
+@transaction.atomic
+def cancelar(item_fila, usuario=None):
+    item_fila = _travar(item_fila)
+    status_anterior = item_fila.status
+    if status_anterior not in ('AGUARDANDO', 'EM_ATENDIMENTO'):
+        raise TransicaoInvalida(item_fila, "O atendimento não está ativo.")
+    item_fila.status = 'CANCELADO'
+    item_fila.data_hora_fim = timezone.now()
+    item_fila.save(update_fields=['status', 'data_hora_fim'])
+    registrar_evento(item_fila, 'CANCELADO', status_anterior=status_anterior, usuario=usuario)
+    _fila_mudou(item_fila.unidade_id)
+    return item_fila
+
+
+# Troca o médico de destino de quem ainda está AGUARDANDO (o status não muda).
+@transaction.atomic
+def reatribuir(item_fila, medico, usuario=None):
+    item_fila = _travar(item_fila)
+    if item_fila.status != 'AGUARDANDO':
+        raise TransicaoInvalida(item_fila, "Só é possível trocar o médico de quem está aguardando.")
+    medico_anterior_id = item_fila.medico_destino_id
+    item_fila.medico_destino = medico
+    item_fila.save(update_fields=['medico_destino'])
+    registrar_evento(item_fila, 'REATRIBUIDO', status_anterior='AGUARDANDO', usuario=usuario,
+                     medico_anterior_id=medico_anterior_id)
+    _fila_mudou(item_fila.unidade_id)
+    return item_fila
+
+
+# ---------------------------------------------------------------------------
+# Transições em lote (ações do painel do atendente e varredura de fim de dia).
+# Em vez de um save() por item, cada lote é: um SELECT ... FOR UPDATE para saber quem
+# realmente pode mudar, um único UPDATE para todos e um único INSERT dos eventos.
+# Itens de outra unidade ou em status que não permite a ação são simplesmente ignorados.
+# cancelar/finalizar aceitam `status_permitidos` para restringir ainda mais: quem selecionou os ids
+# por status (ex: a varredura, que busca só AGUARDANDO) passa esse status, e a trava confere de novo
+# exatamente ele; se a entrada mudou de status entre o SELECT e a trava, fica de fora.
+# Todas retornam quantas entradas foram alteradas.
+# ---------------------------------------------------------------------------
+
+def _transicao_em_lote(unidade, ids, status_permitidos, tipo, status_novo, alteracoes, usuario=None, medico_id=None, **dados):
+    linhas = list(
+        FilaAtendimento.objects.select_for_update()
+        .filter(unidade=unidade, pk__in=ids, status__in=status_permitidos)
+        .values('pk', 'status', 'medico_destino_id')
+    )
+    if not linhas:
+        return 0
+    FilaAtendimento.objects.filter(pk__in=[linha['pk'] for linha in linhas]).update(**alteracoes)
+    registrar_eventos_em_lote(unidade.pk, linhas, tipo, status_novo, usuario=usuario, medico_id=medico_id, **dados)
+    _fila_mudou(unidade.pk)
+    return len(linhas)
+
+
+@transaction.atomic
+def cancelar_em_lote(unidade, ids, usuario=None, status_permitidos=('AGUARDANDO', 'EM_ATENDIMENTO'), **dados):
+    return _transicao_em_lote(
+        unidade, ids, status_permitidos, 'CANCELADO', 'CANCELADO',
+        {'status': 'CANCELADO', 'data_hora_fim': timezone.now()},
+        usuario=usuario, **dados,
+    )
+
+
+@transaction.atomic
+def finalizar_em_lote(unidade, ids, usuario=None, status_permitidos=('AGUARDANDO', 'EM_ATENDIMENTO'), **dados):
+    agora = timezone.now()
+    return _transicao_em_lote(
+        unidade, ids, status_permitidos, 'FINALIZADO', 'ATENDIDO',
+        # Coalesce: mantém a hora da chamada de quem foi chamado; quem não foi recebe a hora de agora.
+        {'status': 'ATENDIDO', 'data_hora_chamada': Coalesce('data_hora_chamada', Value(agora)), 'data_hora_fim': agora},
+        usuario=usuario, **dados,
+    )
+
+
+@transaction.atomic
+def reatribuir_em_lote(unidade, ids, medico, usuario=None, **dados):
+    return _transicao_em_lote(
+        unidade, ids, ('AGUARDANDO',), 'REATRIBUIDO', 'AGUARDANDO',
+        {'medico_destino': medico},
+        usuario=usuario, medico_id=medico.pk, **dados,
+    )
\ No newline at end of file
@@ -0,0 +1,90 @@
+# core/unidades.py
+# Funções de apoio para o multi-unidade: descobrir a unidade do usuário logado
+# e os caches "por unidade" (cada chave leva o id da unidade, então uma unidade
+# nunca lê nem invalida o cache de outra).
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Count, Min, Q
+
+from .models import FilaAtendimento, Medico, Paciente
+
+# Tempo padrão (segundos) dos caches por unidade. As invalidações (core/signals.py)
+# limpam antes disso quando algo muda; o TTL é só uma rede de segurança.
+CACHE_UNIDADE_TIMEOUT = 300
+
+# TTL curto para os contadores da fila: mesmo se alguma mudança escapar da invalidação
+# (ex: alteração direta no admin), o painel não fica defasado por mais que isso.
+CACHE_CONTAGEM_TIMEOUT = 15
+
+
+# Descubro a unidade do usuário: médico pela própria tabela Medico, os demais pela Lotacao.
+# Retorna None se o usuário não estiver ligado a nenhuma unidade (ex: superusuário do admin).
+def unidade_do_usuario(user):
+    if not user.is_authenticated:
+        return None
+    for relacao in ('medico', 'lotacao'):
+        try:
+            return getattr(user, relacao).unidade
+        except ObjectDoesNotExist:
+            continue
+    return None
+
+
+# Monta a chave de cache de uma unidade. Ex: chave_cache(3, 'medicos') -> 'unidade:3:medicos'.
+def chave_cache(unidade_id, nome):
+    return f'unidade:{unidade_id}:{nome}'
+
+
+# Limpa um cache da unidade (chamado pelos signals quando os dados mudam).
+def invalidar_cache(unidade_id, nome):
+    cache.delete(chave_cache(unidade_id, nome))
+
+
+# Lista de médicos da unidade, usada na barra lateral do painel do atendente.
+# Já vem com o user junto (select_related), para o template não fazer uma query por médico.
+def medicos_da_unidade(unidade_id):
+    return cache.get_or_set(
+        chave_cache(unidade_id, 'medicos'),
+        lambda: list(Medico.objects.filter(unidade_id=unidade_id).select_related('user').order_by('user__first_name', 'user__username')),
+        CACHE_UNIDADE_TIMEOUT,
+    )
+
+
+# Busca exata do paciente pela Carteira do SUS dentro da unidade (check-in do quiosque).
+# No banco, usa o índice da UniqueConstraint (unidade, carteira_sus); o resultado (só o id)
+# fica no cache da unidade. Não guardo "não encontrado", para um cadastro novo valer na hora.
+# Quem usa o id deve conferir o paciente na hora de travar a linha (o cache pode estar velho).
+def paciente_id_por_sus(unidade_id, carteira_sus):
+    chave = chave_cache(unidade_id, f'sus:{carteira_sus}')
+    paciente_id = cache.get(chave)
+    if paciente_id is None:
+        paciente_id = (
+            Paciente.objects.filter(unidade_id=unidade_id, carteira_sus=carteira_sus, anonimizado_em__isnull=True) # Anonimizado não faz check-in.
+            .values_list('pk', flat=True).first()
+        )
+        if paciente_id is not None:
+            cache.set(chave, paciente_id, CACHE_UNIDADE_TIMEOUT)
+    return paciente_id
+
+
+# Contadores da fila ativa por médico, para a barra lateral do painel do atendente:
+#     {medico_id: {'aguardando': 3, 'em_atendimento': 1, 'chegada_mais_antiga': datetime}, ...}
+# Uma query agrupada só para a unidade inteira (não importa quantos médicos), no cache da unidade.
+# Quem está na fila sem médico definido fica na chave None. Médico sem ninguém na fila não aparece.
+# Guardo a chegada mais antiga, e não o tempo de espera, para a espera mostrada continuar certa
+# enquanto o valor estiver no cache. O cache é limpo pelas transições da fila (core/transicoes.py).
+def contagem_fila_por_medico(unidade_id):
+    def calcular():
+        linhas = (
+            FilaAtendimento.objects.filter(unidade_id=unidade_id, status__in=('AGUARDANDO', 'EM_ATENDIMENTO'))
+            .values('medico_destino_id')
+            .annotate(
+                aguardando=Count('pk', filter=Q(status='AGUARDANDO')),
+                em_atendimento=Count('pk', filter=Q(status='EM_ATENDIMENTO')),
+                chegada_mais_antiga=Min('data_hora_chegada', filter=Q(status='AGUARDANDO')),
+            )
+            .order_by() # Sem o ordering padrão do modelo, que entraria no GROUP BY.
+        )
+        return {linha.pop('medico_destino_id'): linha for linha in linhas}
+
+    return cache.get_or_set(chave_cache(unidade_id, 'contagem_fila'), calcular, CACHE_CONTAGEM_TIMEOUT)
@@ -4,8 +4,10 @@ from .views import (
     HomeView, 
     AtendentePainelView, PacienteCreateView, ChamarPacienteView, AtendimentoDetailView,
     FinalizarAtendimentoView, PacienteListView, AdicionarPacienteFilaView, PacienteUpdateView,
-    PacienteClinicalUpdateView, PacienteDeleteView, MedicoPollingAPIView
+    PacienteClinicalUpdateView, PacienteDeleteView, MedicoPollingAPIView, AcaoEmLoteFilaView,
+    QuiosqueCheckinAPIView, BuscaAtendimentosView, DocumentoAtendimentoView
 )
+from .api_async import MedicoPollingAsyncAPIView
 
 # Importando as views necessárias para as URLs
 urlpatterns = [
@@ -13,8 +15,11 @@ urlpatterns = [
     path('painel-atendente/', AtendentePainelView.as_view(), name='painel_atendente'),
     path('paciente/novo/', PacienteCreateView.as_view(), name='paciente_novo'),
     path('fila/chamar/<int:pk>/', ChamarPacienteView.as_view(), name='chamar_paciente'),
+    path('fila/acoes-em-lote/', AcaoEmLoteFilaView.as_view(), name='acoes_em_lote_fila'),
     path('atendimento/<int:pk>/', AtendimentoDetailView.as_view(), name='atendimento_detalhe'), 
     path('atendimento/finalizar/<int:pk>/', FinalizarAtendimentoView.as_view(), name='finalizar_atendimento'),
+    path('atendimento/<int:pk>/documento/<str:tipo>/', DocumentoAtendimentoView.as_view(), name='documento_atendimento'),
+    path('atendimentos/busca/', BuscaAtendimentosView.as_view(), name='busca_atendimentos'),
     path('pacientes/', PacienteListView.as_view(), name='paciente_list'),
     path('paciente/<int:paciente_pk>/adicionar-fila/', AdicionarPacienteFilaView.as_view(), name='adicionar_paciente_fila'),
     path('paciente/<int:pk>/editar/', PacienteUpdateView.as_view(), name='paciente_editar'),
@@ -23,6 +28,9 @@ urlpatterns = [
         name='paciente_editar_clinico'),
     path('paciente/<int:pk>/deletar/', PacienteDeleteView.as_view(), name='paciente_deletar'),
     path('api/medico/status-fila/', MedicoPollingAPIView.as_view(), name='api_medico_status_fila'),
+    path('api/quiosque/checkin/', QuiosqueCheckinAPIView.as_view(), name='api_quiosque_checkin'),
+    # API async (core/api_async.py): rende mais servida pelo gestor_filas/asgi.py.
+    path('api/async/medico/status-fila/', MedicoPollingAsyncAPIView.as_view(), name='api_async_medico_status_fila'),
 ]
 
-print("Arquivo core/urls.py criado!")
\ No newline at end of file
+print("Arquivo core/urls.py criado!")
\ No newline at end of file
@@ -11,7 +11,55 @@ from django.contrib import messages # Para exibir mensagens ao usuário
 from django.db.models import Q # Para queries complexas (OR, AND)
 from django.views.generic.edit import CreateView, UpdateView, DeleteView # Views genéricas para CRUD
 from django.contrib.messages.views import SuccessMessageMixin # Para adicionar mensagens de sucesso automaticamente
-from django.http import JsonResponse # Para retornar respostas JSON (usado na API de polling)
+from django.http import JsonResponse, HttpResponse, Http404 # JsonResponse para a API de polling; HttpResponse/Http404 para os documentos impressos
+from django.core.exceptions import PermissionDenied, ValidationError # Para barrar usuários sem unidade e validar o SUS na unidade
+from .unidades import unidade_do_usuario, medicos_da_unidade, paciente_id_por_sus, invalidar_cache, contagem_fila_por_medico # Apoio ao multi-unidade
+import json # Para ler o corpo JSON da API do quiosque
+from . import transicoes # Mudanças de status da fila (cada uma grava seu EventoFila na mesma transação)
+from . import privacidade # Exclusão/anonimização de pacientes em lotes
+from .documentos import TIPOS_DOCUMENTO, atendimentos_para_impressao, renderizar_documento # Pedido de exames e resumo para imprimir
+from .transicoes import TransicaoInvalida
+from .busca import busca_disponivel, buscar_atendimentos # Busca textual nas anotações clínicas
+from django.utils.dateparse import parse_date # Para ler as datas do filtro da busca
+from urllib.parse import urlencode # Para manter os filtros da busca nos links da paginação
+
+# Mixin que descobre a unidade do usuário logado (self.unidade) para as views filtrarem tudo por ela.
+# Vai DEPOIS do LoginRequiredMixin/UserPassesTestMixin na lista de bases, para só rodar depois dos testes de acesso.
+class UnidadeMixin:
+
+    def dispatch(self, request, *args, **kwargs):
+        self.unidade = unidade_do_usuario(request.user)
+        if self.unidade is None:
+            # Sem unidade não tem como saber qual fila mostrar, então barro o acesso.
+            raise PermissionDenied("Seu usuário não está vinculado a nenhuma unidade. Contate o administrador.")
+        return super().dispatch(request, *args, **kwargs)
+
+# Mixin para os formulários de Paciente: associa o paciente à unidade do usuário e
+# garante que o SUS não se repita dentro da unidade.
+# (A UniqueConstraint do modelo não é validada pelo ModelForm, porque 'unidade' não é um campo do form.)
+class PacienteDaUnidadeFormMixin(UnidadeMixin):
+
+    def get_form_class(self):
+        form_class = super().get_form_class()
+        unidade = self.unidade
+
+        class PacienteDaUnidadeForm(form_class):
+            def clean_carteira_sus(self):
+                carteira_sus = self.cleaned_data['carteira_sus']
+                duplicados = Paciente.objects.filter(unidade=unidade, carteira_sus=carteira_sus)
+                if self.instance.pk:
+                    duplicados = duplicados.exclude(pk=self.instance.pk) # Na edição, ignoro o próprio paciente.
+                if duplicados.exists():
+                    raise ValidationError("Já existe um paciente com esta Carteira do SUS nesta unidade.")
+                return carteira_sus
+
+        return PacienteDaUnidadeForm
+
+    # O paciente novo (ou editado) fica sempre na unidade de quem está cadastrando.
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.instance.unidade = self.unidade
+        return form
 
 # View para o médico verificar via AJAX se há pacientes na fila ou em atendimento.
 # Isso é para atualizar a interface do médico dinamicamente sem recarregar a página.
@@ -29,16 +77,19 @@ class MedicoPollingAPIView(LoginRequiredMixin, UserPassesTestMixin, View):
             medico_logado = request.user.medico
 
             # Primeiro, verifico se há algum paciente JÁ EM ATENDIMENTO com este médico.
+            # Filtro também pela unidade do médico, para a consulta usar o índice (unidade, medico_destino, status, ...).
             atendimento_atual = FilaAtendimento.objects.filter(
+                unidade_id=medico_logado.unidade_id,
                 medico_destino=medico_logado,
                 status='EM_ATENDIMENTO'
-            ).order_by('-data_hora_chamada').first() # Pego o mais recente chamado, caso haja mais de um (não deveria).
+            ).select_related('paciente').order_by('-data_hora_chamada').first() # Pego o mais recente chamado, caso haja mais de um (não deveria).
 
             if atendimento_atual:
                 # Se tem alguém em atendimento, retorno os dados desse atendimento.
                 data = {
                     'status_geral': 'em_atendimento',
                     'atendimento_id': atendimento_atual.pk,
+                    'senha': atendimento_atual.senha, # Senha do dia (ex: "CLI-042"), para chamar no salão/painel de chamada.
                     'paciente_id': atendimento_atual.paciente.pk,
                     'paciente_nome': atendimento_atual.paciente.nome_completo,
                     'status_atendimento': atendimento_atual.get_status_display(), # Pega o valor "human-readable" do status
@@ -48,15 +99,17 @@ class MedicoPollingAPIView(LoginRequiredMixin, UserPassesTestMixin, View):
 
             # Se não há ninguém EM_ATENDIMENTO, procuro o próximo AGUARDANDO.
             proximo_aguardando = FilaAtendimento.objects.filter(
+                unidade_id=medico_logado.unidade_id,
                 medico_destino=medico_logado,
                 status='AGUARDANDO'
-            ).order_by('data_hora_chegada').first() # Pego o que chegou primeiro.
+            ).select_related('paciente').order_by('data_hora_chegada').first() # Pego o que chegou primeiro.
 
             if proximo_aguardando:
                 # Se tem alguém aguardando, retorno os dados desse próximo paciente.
                 data = {
                     'status_geral': 'aguardando_proximo',
                     'atendimento_id': proximo_aguardando.pk,
+                    'senha': proximo_aguardando.senha, # Senha do dia (ex: "CLI-042"), para chamar no salão/painel de chamada.
                     'paciente_id': proximo_aguardando.paciente.pk,
                     'paciente_nome': proximo_aguardando.paciente.nome_completo,
                     'status_atendimento': proximo_aguardando.get_status_display(),
@@ -75,9 +128,73 @@ class MedicoPollingAPIView(LoginRequiredMixin, UserPassesTestMixin, View):
             print(f"Erro na MedicoPollingAPIView: {e}")
             return JsonResponse({'status_geral': 'erro', 'mensagem': 'Ocorreu um erro no servidor.'}, status=500)
 
+# API do quiosque de autoatendimento: o paciente digita (ou passa o cartão com) a Carteira do SUS,
+# escolhe a especialidade ou o médico, e entra na fila em uma única requisição.
+# Feita para o pico da abertura: busca exata por SUS (índice + cache da unidade), e
+# reenvios do mesmo paciente (duplo toque) devolvem a mesma entrada em vez de criar outra.
+class QuiosqueCheckinAPIView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, View):
+
+    # Só os usuários dos totens (grupo 'Quiosques', com Lotacao na unidade).
+    def test_func(self):
+        return self.request.user.groups.filter(name='Quiosques').exists()
+
+    def post(self, request, *args, **kwargs):
+        # Aceito tanto JSON quanto formulário comum.
+        if request.content_type == 'application/json':
+            try:
+                dados = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'status_geral': 'erro', 'mensagem': 'JSON inválido.'}, status=400)
+        else:
+            dados = request.POST
+        if not isinstance(dados, dict): # JSON válido, mas não um objeto (ex: uma lista).
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Envie um objeto JSON.'}, status=400)
+
+        # Tiro os espaços: o número vem digitado como está impresso no cartão ("700 0000 0000 0001").
+        carteira_sus = ''.join(str(dados.get('carteira_sus', '')).split())
+        if not carteira_sus.isalnum(): # Número do cartão: só letras/dígitos (também evita chaves de cache estranhas).
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Informe o número da Carteira do SUS.'}, status=400)
+
+        # Candidatos: o médico escolhido ou todos os médicos da especialidade, sempre da unidade do totem.
+        medicos = medicos_da_unidade(self.unidade.pk)
+        medico_id = str(dados.get('medico_id', '')).strip()
+        especialidade = str(dados.get('especialidade', '')).strip()
+        if medico_id:
+            candidatos = [m for m in medicos if str(m.pk) == medico_id]
+        elif especialidade:
+            candidatos = [m for m in medicos if m.especialidade.casefold() == especialidade.casefold()]
+        else:
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Escolha uma especialidade ou um médico.'}, status=400)
+        if not candidatos:
+            return JsonResponse({'status_geral': 'erro', 'mensagem': 'Nenhum médico disponível para esta escolha.'}, status=400)
+
+        # Duas tentativas: se o id do cache estiver velho (SUS alterado, paciente apagado),
+        # a transição não acha o paciente; limpo o cache e busco de novo direto no banco.
+        for _ in range(2):
+            paciente_id = paciente_id_por_sus(self.unidade.pk, carteira_sus)
+            if paciente_id is None:
+                return JsonResponse({'status_geral': 'nao_encontrado', 'mensagem': 'Carteira do SUS não encontrada. Procure a recepção.'}, status=404)
+            try:
+                item_fila, criado = transicoes.checkin(paciente_id, carteira_sus, self.unidade, candidatos, usuario=request.user)
+                break
+            except Paciente.DoesNotExist:
+                invalidar_cache(self.unidade.pk, f'sus:{carteira_sus}')
+        else:
+            return JsonResponse({'status_geral': 'nao_encontrado', 'mensagem': 'Carteira do SUS não encontrada. Procure a recepção.'}, status=404)
+
+        medico = item_fila.medico_destino
+        return JsonResponse({
+            'status_geral': 'enfileirado' if criado else 'ja_na_fila',
+            'atendimento_id': item_fila.pk,
+            'senha': item_fila.senha, # O totem imprime esta senha para o paciente.
+            'medico_nome': medico.user.get_full_name() or medico.user.username,
+            'especialidade': medico.especialidade,
+            'hora_chegada': timezone.localtime(item_fila.data_hora_chegada).strftime('%H:%M'),
+        }, status=201 if criado else 200)
+
 # View para deletar um Paciente.
 # Usa SuccessMessageMixin para exibir uma mensagem de sucesso automaticamente.
-class PacienteDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixin, DeleteView):
+class PacienteDeleteView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, SuccessMessageMixin, DeleteView):
     model = Paciente # Modelo que esta view vai manipular.
     template_name = 'paciente_confirm_delete.html' # Template de confirmação.
     success_url = reverse_lazy('paciente_list') # Para onde redirecionar após a exclusão bem-sucedida.
@@ -86,6 +203,10 @@ class PacienteDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
     def test_func(self):
         return self.request.user.groups.filter(name='Atendentes').exists()
 
+    # Só deixo apagar pacientes da própria unidade.
+    def get_queryset(self):
+        return Paciente.objects.filter(unidade=self.unidade)
+
     # Adiciono um título à página para clareza.
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -94,14 +215,24 @@ class PacienteDeleteView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
 
     # Sobrescrevo form_valid para adicionar uma mensagem de sucesso personalizada usando o messages framework.
     # O SuccessMessageMixin usaria o atributo `success_message`, mas aqui prefiro formatar dinamicamente.
+    # A exclusão não usa o self.object.delete() padrão (que carrega o histórico inteiro da fila em memória):
+    # vai pela exclusão em lotes de core/privacidade.py, que também recusa paciente que está na fila agora.
+    # A mensagem diz o motivo de verdade quando nada foi excluído: paciente na fila, ou que já não existia
+    # (ex: outro atendente excluiu entre abrir a confirmação e confirmar).
     def form_valid(self, form):
-        messages.success(self.request, f"Paciente {self.object.nome_completo} excluído com sucesso!")
-        return super().form_valid(form)
+        excluidos, _, nao_encontrados, _ = privacidade.excluir_lote_detalhado([self.object.pk])
+        if excluidos:
+            messages.success(self.request, f"Paciente {self.object.nome_completo} excluído com sucesso!")
+        elif nao_encontrados:
+            messages.warning(self.request, f"Paciente {self.object.nome_completo} não existe mais (já tinha sido excluído).")
+        else:
+            messages.warning(self.request, f"Paciente {self.object.nome_completo} está na fila (aguardando ou em atendimento) e não foi excluído.")
+        return redirect(self.get_success_url())
 
 
 # View para o Médico atualizar informações CLÍNICAS de um Paciente.
 # Esta view é acessada geralmente a partir da tela de atendimento.
-class PacienteClinicalUpdateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixin, UpdateView):
+class PacienteClinicalUpdateView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, SuccessMessageMixin, UpdateView):
     model = Paciente
     template_name = 'paciente_clinical_form.html' # Um formulário específico para dados clínicos.
     fields = [ # Campos que o médico pode editar.
@@ -118,6 +249,10 @@ class PacienteClinicalUpdateView(LoginRequiredMixin, UserPassesTestMixin, Succes
     def test_func(self):
         return self.request.user.groups.filter(name='Médicos').exists()
 
+    # O médico só edita pacientes da unidade dele.
+    def get_queryset(self):
+        return Paciente.objects.filter(unidade=self.unidade)
+
     # Após atualizar, quero voltar para a tela de detalhes do atendimento, se eu vim de lá.
     def get_success_url(self):
         atendimento_pk = self.kwargs.get('atendimento_pk') # Pego o pk do atendimento da URL.
@@ -139,7 +274,7 @@ class PacienteClinicalUpdateView(LoginRequiredMixin, UserPassesTestMixin, Succes
 
 
 # View para o Atendente atualizar dados CADASTRAIS de um Paciente.
-class PacienteUpdateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixin, UpdateView):
+class PacienteUpdateView(LoginRequiredMixin, UserPassesTestMixin, PacienteDaUnidadeFormMixin, SuccessMessageMixin, UpdateView):
     model = Paciente
     template_name = 'paciente_form.html' # Um formulário genérico para dados do paciente.
     fields = [ # Campos que o atendente pode editar.
@@ -153,6 +288,10 @@ class PacienteUpdateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
     def test_func(self):
         return self.request.user.groups.filter(name='Atendentes').exists()
 
+    # Só pacientes da unidade do atendente.
+    def get_queryset(self):
+        return Paciente.objects.filter(unidade=self.unidade)
+
     # Contexto para o template.
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -160,7 +299,7 @@ class PacienteUpdateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
         return context
 
 # View para o Atendente adicionar um PACIENTE JÁ EXISTENTE à fila de um médico.
-class AdicionarPacienteFilaView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class AdicionarPacienteFilaView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, CreateView):
     model = FilaAtendimento # Vamos criar uma nova entrada na FilaAtendimento.
     template_name = 'adicionar_paciente_fila_form.html'
     fields = ['medico_destino', 'observacoes'] # O atendente escolhe o médico e pode adicionar observações.
@@ -173,24 +312,36 @@ class AdicionarPacienteFilaView(LoginRequiredMixin, UserPassesTestMixin, CreateV
     def get_success_url(self):
         return reverse_lazy('painel_atendente')
 
+    # O select de médicos só mostra os médicos da unidade do atendente.
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        form.fields['medico_destino'].queryset = Medico.objects.filter(unidade=self.unidade).select_related('user')
+        return form
+
     # No contexto, preciso saber qual paciente estou adicionando à fila.
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         paciente_pk = self.kwargs.get('paciente_pk') # Pego o pk do paciente da URL.
-        context['paciente_para_adicionar'] = get_object_or_404(Paciente, pk=paciente_pk)
+        context['paciente_para_adicionar'] = get_object_or_404(Paciente, pk=paciente_pk, unidade=self.unidade)
         return context
 
-    # Antes de salvar o formulário da FilaAtendimento, preciso associar o paciente.
+    # Em vez de salvar o form direto, crio a entrada pela transição 'enfileirar',
+    # que já associa paciente/unidade, coloca AGUARDANDO e grava o evento.
     def form_valid(self, form):
         paciente_pk = self.kwargs.get('paciente_pk')
-        paciente_obj = get_object_or_404(Paciente, pk=paciente_pk)
+        paciente_obj = get_object_or_404(Paciente, pk=paciente_pk, unidade=self.unidade)
 
-        form.instance.paciente = paciente_obj # Associo o paciente ao form.instance.
-        form.instance.status = 'AGUARDANDO' # Status inicial.
-        # data_hora_chegada é auto_now_add no model, então não preciso setar aqui.
+        self.object = transicoes.enfileirar(
+            paciente_obj,
+            self.unidade, # A entrada na fila é da unidade do atendente.
+            medico=form.cleaned_data['medico_destino'],
+            observacoes=form.cleaned_data['observacoes'],
+            usuario=self.request.user,
+        )
+        # data_hora_chegada tem default=timezone.now no model, então não preciso setar aqui.
 
-        messages.success(self.request, f"Paciente {paciente_obj.nome_completo} adicionado à fila com sucesso!")
-        return super().form_valid(form)
+        messages.success(self.request, f"Paciente {paciente_obj.nome_completo} adicionado à fila com sucesso! Senha: {self.object.senha}")
+        return redirect(self.get_success_url())
 
 # View da página inicial (Home).
 # Mostra informações diferentes dependendo do grupo do usuário (Atendente ou Médico).
@@ -219,14 +370,16 @@ class HomeView(LoginRequiredMixin, TemplateView):
             try:
                 medico_logado = user.medico # Pego o objeto Medico.
 
-                # Busco pacientes em atendimento por este médico.
+                # Busco pacientes em atendimento por este médico (sempre pela unidade dele, por causa dos índices).
                 pacientes_em_atendimento = FilaAtendimento.objects.filter(
+                    unidade_id=medico_logado.unidade_id,
                     medico_destino=medico_logado,
                     status='EM_ATENDIMENTO'
                 ).order_by('data_hora_chamada')
 
                 # Busco pacientes aguardando por este médico.
                 pacientes_aguardando = FilaAtendimento.objects.filter(
+                    unidade_id=medico_logado.unidade_id,
                     medico_destino=medico_logado,
                     status='AGUARDANDO'
                 ).order_by('data_hora_chegada')
@@ -263,7 +416,7 @@ class HomeView(LoginRequiredMixin, TemplateView):
 
 # Painel do Atendente: lista os pacientes que estão AGUARDANDO na fila.
 # Permite filtrar por médico.
-class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, ListView):
     model = FilaAtendimento
     template_name = 'atendente_painel.html'
     context_object_name = 'fila_list' # Nome da variável no template para a lista de itens da fila.
@@ -275,7 +428,7 @@ class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     # Defino o queryset base e aplico filtros se necessário.
     def get_queryset(self):
-        queryset = FilaAtendimento.objects.filter(status='AGUARDANDO') # Só os que estão aguardando.
+        queryset = FilaAtendimento.objects.filter(unidade=self.unidade, status='AGUARDANDO') # Só os que estão aguardando, e só da unidade do atendente.
 
         medico_id_da_url = self.request.GET.get('medico_id') # Pego o 'medico_id' da URL (query param).
 
@@ -293,12 +446,26 @@ class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, ListView):
             # Se nenhum medico_id foi passado, mostro a fila geral de todos os médicos.
             print("DEBUG get_queryset: Nenhum medico_id na URL, mostrando Fila Geral.")
 
-        return queryset.order_by('data_hora_chegada') # Ordeno pela hora de chegada.
+        return queryset.select_related('paciente').order_by('data_hora_chegada') # Ordeno pela hora de chegada. O select_related evita uma query por paciente no template.
 
     # Adiciono mais coisas ao contexto.
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['medicos'] = Medico.objects.all() # Para popular um dropdown de filtro de médicos.
+        medicos = medicos_da_unidade(self.unidade.pk) # Médicos da unidade, vindo do cache por unidade.
+        context['medicos'] = medicos # Para popular um dropdown de filtro de médicos.
+
+        # Contadores de cada médico na barra lateral (aguardando, em atendimento, espera mais longa).
+        # Vêm de UMA query agrupada da unidade (em cache curto), e não de uma query por médico.
+        contagem = contagem_fila_por_medico(self.unidade.pk)
+        sem_fila = {'aguardando': 0, 'em_atendimento': 0, 'chegada_mais_antiga': None}
+        context['medicos_resumo'] = [{'medico': medico, **contagem.get(medico.pk, sem_fila)} for medico in medicos]
+        # Totais da Fila Geral: soma de todos, incluindo quem está sem médico definido.
+        chegadas = [c['chegada_mais_antiga'] for c in contagem.values() if c['chegada_mais_antiga']]
+        context['fila_geral_resumo'] = {
+            'aguardando': sum(c['aguardando'] for c in contagem.values()),
+            'em_atendimento': sum(c['em_atendimento'] for c in contagem.values()),
+            'chegada_mais_antiga': min(chegadas) if chegadas else None,
+        }
 
         medico_id_da_url = self.request.GET.get('medico_id')
         context['medico_selecionado'] = None # Inicializo como None.
@@ -306,7 +473,10 @@ class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         if medico_id_da_url:
             try:
                 medico_id_int = int(medico_id_da_url)
-                context['medico_selecionado'] = Medico.objects.get(pk=medico_id_int) # Para saber qual médico está selecionado.
+                # Procuro na lista já carregada, sem ir ao banco. Médico de outra unidade simplesmente não é encontrado.
+                context['medico_selecionado'] = next((m for m in medicos if m.pk == medico_id_int), None)
+                if context['medico_selecionado'] is None:
+                    raise Medico.DoesNotExist
                 # Mais debug.
                 print(f"DEBUG get_context_data: Médico Selecionado: {context['medico_selecionado']}")
             except Medico.DoesNotExist:
@@ -321,7 +491,7 @@ class AtendentePainelView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
 # View para o Atendente cadastrar um NOVO Paciente.
 # Pode, opcionalmente, já adicionar este novo paciente à fila de um médico específico.
-class PacienteCreateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessageMixin, CreateView):
+class PacienteCreateView(LoginRequiredMixin, UserPassesTestMixin, PacienteDaUnidadeFormMixin, SuccessMessageMixin, CreateView):
     model = Paciente
     template_name = 'paciente_form.html' # Reutilizo o mesmo form de edição.
     fields = [
@@ -339,7 +509,7 @@ class PacienteCreateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
         medico_id_param = self.request.GET.get('medico_id') # Pego da URL.
         if medico_id_param:
             try:
-                medico = Medico.objects.get(pk=medico_id_param)
+                medico = Medico.objects.get(pk=medico_id_param, unidade=self.unidade)
                 # Se tem medico_id, o título indica que vamos cadastrar E adicionar à fila.
                 context['form_title'] = f"Cadastrar Paciente e Adicionar à Fila do(a) Dr(a). {medico.user.get_full_name() or medico.user.username}"
             except Medico.DoesNotExist:
@@ -358,15 +528,10 @@ class PacienteCreateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
 
         if medico_id:
             try:
-                medico_obj = Medico.objects.get(pk=medico_id)
+                medico_obj = Medico.objects.get(pk=medico_id, unidade=self.unidade)
                 # Crio a entrada na FilaAtendimento para este novo paciente e o médico especificado.
-                FilaAtendimento.objects.create(
-                    paciente=novo_paciente,
-                    medico_destino=medico_obj,
-                    status='AGUARDANDO',
-                    # data_hora_chegada é auto_now_add
-                )
-                messages.success(self.request, f"Paciente {novo_paciente.nome_completo} cadastrado e adicionado à fila do(a) Dr(a). {medico_obj.user.get_full_name() or medico_obj.user.username}.")
+                item_fila = transicoes.enfileirar(novo_paciente, self.unidade, medico=medico_obj, usuario=self.request.user)
+                messages.success(self.request, f"Paciente {novo_paciente.nome_completo} cadastrado e adicionado à fila do(a) Dr(a). {medico_obj.user.get_full_name() or medico_obj.user.username}. Senha: {item_fila.senha}")
             except Medico.DoesNotExist:
                 messages.warning(self.request, f"Paciente {novo_paciente.nome_completo} cadastrado, mas o médico (ID: {medico_id}) não foi encontrado. Paciente não adicionado à fila.")
             except Exception as e: # Captura outros erros na criação da FilaAtendimento.
@@ -397,7 +562,7 @@ class PacienteCreateView(LoginRequiredMixin, UserPassesTestMixin, SuccessMessage
 
 # View para o Atendente "chamar" um paciente da fila.
 # Isso muda o status do paciente de 'AGUARDANDO' para 'EM_ATENDIMENTO'.
-class ChamarPacienteView(LoginRequiredMixin, UserPassesTestMixin, View):
+class ChamarPacienteView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, View):
 
     # Só atendentes.
     def test_func(self):
@@ -406,21 +571,67 @@ class ChamarPacienteView(LoginRequiredMixin, UserPassesTestMixin, View):
     # Ação de chamar é um POST, pois modifica o estado do recurso.
     def post(self, request, *args, **kwargs):
         pk_fila = self.kwargs.get('pk') # Pk da FilaAtendimento.
-        item_fila = get_object_or_404(FilaAtendimento, pk=pk_fila)
+        item_fila = get_object_or_404(FilaAtendimento, pk=pk_fila, unidade=self.unidade) # Só itens da unidade do atendente.
 
-        if item_fila.status == 'AGUARDANDO':
-            item_fila.status = 'EM_ATENDIMENTO'
-            item_fila.data_hora_chamada = timezone.now() # Registra a hora da chamada.
-            item_fila.save()
+        try:
+            # A transição confere o status com a linha travada, então dois atendentes não chamam o mesmo paciente.
+            transicoes.chamar(item_fila, usuario=request.user)
             messages.success(request, f"Paciente {item_fila.paciente.nome_completo} chamado com sucesso!")
-        else:
+        except TransicaoInvalida:
             messages.warning(request, f"O paciente {item_fila.paciente.nome_completo} não estava aguardando.")
 
         return redirect('painel_atendente') # Volta para o painel.
 
+# View para o Atendente aplicar uma ação a vários itens da fila de uma vez
+# (checkboxes do painel): cancelar, finalizar ou trocar o médico.
+# Cada ação é um único UPDATE no banco (ver transições em lote em core/transicoes.py).
+class AcaoEmLoteFilaView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, View):
+
+    # Só atendentes.
+    def test_func(self):
+        return self.request.user.groups.filter(name='Atendentes').exists()
+
+    def post(self, request, *args, **kwargs):
+        acao = request.POST.get('acao')
+        # Ignoro qualquer id que não seja número (o filtro por unidade na transição cuida do resto).
+        ids = [int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()]
+
+        # Volto para o painel mantendo o filtro de médico que estava na tela.
+        destino = reverse_lazy('painel_atendente')
+        medico_id_filtro = request.POST.get('medico_id_filtro', '')
+        if medico_id_filtro.isdigit(): # Só um id numérico entra na URL de volta.
+            destino = f"{destino}?{urlencode({'medico_id': medico_id_filtro})}"
+
+        if not ids:
+            messages.warning(request, "Selecione pelo menos um paciente da fila.")
+            return redirect(destino)
+
+        if acao == 'cancelar':
+            alterados = transicoes.cancelar_em_lote(self.unidade, ids, usuario=request.user)
+            messages.success(request, f"{alterados} atendimento(s) cancelado(s).")
+        elif acao == 'finalizar':
+            alterados = transicoes.finalizar_em_lote(self.unidade, ids, usuario=request.user)
+            messages.success(request, f"{alterados} atendimento(s) finalizado(s).")
+        elif acao == 'reatribuir':
+            try:
+                medico_novo = Medico.objects.get(pk=request.POST.get('medico_novo'), unidade=self.unidade)
+            except (Medico.DoesNotExist, ValueError):
+                messages.error(request, "Escolha um médico válido da sua unidade para reatribuir.")
+                return redirect(destino)
+            alterados = transicoes.reatribuir_em_lote(self.unidade, ids, medico_novo, usuario=request.user)
+            messages.success(request, f"{alterados} paciente(s) reatribuído(s) para Dr(a). {medico_novo.user.get_full_name() or medico_novo.user.username}.")
+        else:
+            messages.error(request, "Ação em lote desconhecida. Nenhuma ação realizada.")
+            return redirect(destino)
+
+        # Se nem todos os selecionados mudaram (ex: outro atendente já chamou), aviso.
+        if alterados < len(ids):
+            messages.info(request, f"{len(ids) - alterados} item(ns) selecionado(s) não estava(m) mais na situação esperada e foi(ram) ignorado(s).")
+        return redirect(destino)
+
 # View de detalhes do atendimento, usada pelo MÉDICO.
 # É aqui que o médico vê os dados do paciente, a fila dele, e registra informações do atendimento.
-class AtendimentoDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class AtendimentoDetailView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, DetailView):
     model = FilaAtendimento # O objeto principal desta view é um item da FilaAtendimento.
     template_name = 'medico_painel.html' # O "painel do médico" é, na verdade, o detalhe de um atendimento.
     context_object_name = 'atendimento' # Nome do objeto no template.
@@ -429,6 +640,10 @@ class AtendimentoDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
     def test_func(self):
         return self.request.user.groups.filter(name='Médicos').exists()
 
+    # Só atendimentos da unidade do médico.
+    def get_queryset(self):
+        return FilaAtendimento.objects.filter(unidade=self.unidade).select_related('paciente')
+
     # Adiciono muitas informações ao contexto para o template do médico.
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -441,9 +656,10 @@ class AtendimentoDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
             medico_para_fila = atendimento_atual.medico_destino
             if medico_para_fila:
                 fila_do_medico = FilaAtendimento.objects.filter(
+                    unidade=self.unidade,
                     medico_destino=medico_para_fila,
                     status__in=['AGUARDANDO', 'EM_ATENDIMENTO'] # Apenas os que estão na fila ou sendo atendidos.
-                ).exclude(pk=atendimento_atual.pk).order_by('-status', 'data_hora_chegada') # EM_ATENDIMENTO primeiro, depois por chegada.
+                ).exclude(pk=atendimento_atual.pk).select_related('paciente').order_by('-status', 'data_hora_chegada') # EM_ATENDIMENTO primeiro, depois por chegada.
                 context['fila_do_medico'] = fila_do_medico
             else:
                 context['fila_do_medico'] = FilaAtendimento.objects.none() # Fila vazia se não tiver médico.
@@ -487,15 +703,34 @@ class AtendimentoDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
         atendimento.evolucao_consulta = request.POST.get('evolucao_consulta', '').strip()
         atendimento.conduta_adotada = request.POST.get('conduta_adotada', '').strip()
 
-        atendimento.save() # Salvo as alterações no objeto FilaAtendimento.
+        # Salvo só os campos do formulário: um save() completo regravaria também status e médico lidos
+        # acima, desfazendo uma transição (core/transicoes.py) feita entre a leitura e este save.
+        atendimento.save(update_fields=['exames_checkbox_selecionados', 'exame_outro_digitado', 'evolucao_consulta', 'conduta_adotada'])
         messages.success(request, "Dados do atendimento (exames e notas) foram salvos com sucesso!")
 
         # Redireciono para a mesma página (detalhe do atendimento) para mostrar os dados salvos.
         return redirect('atendimento_detalhe', pk=atendimento.pk)
 
+# Documento para imprimir de um atendimento: pedido de exames ('exames') ou resumo ('resumo').
+# Médicos imprimem no fim da consulta; atendentes reimprimem depois. O HTML vem do cache se
+# nada mudou no atendimento desde a última impressão (ver core/documentos.py).
+class DocumentoAtendimentoView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, View):
+
+    # Médicos e atendentes.
+    def test_func(self):
+        return self.request.user.groups.filter(name__in=['Médicos', 'Atendentes']).exists()
+
+    def get(self, request, *args, **kwargs):
+        tipo = self.kwargs['tipo']
+        if tipo not in TIPOS_DOCUMENTO:
+            raise Http404("Tipo de documento desconhecido.")
+        atendimento = get_object_or_404(atendimentos_para_impressao(), pk=self.kwargs['pk'], unidade=self.unidade)
+        html, _ = renderizar_documento(atendimento, tipo)
+        return HttpResponse(html)
+
 # View para o Médico "finalizar" um atendimento.
 # Muda o status para 'ATENDIDO'.
-class FinalizarAtendimentoView(LoginRequiredMixin, UserPassesTestMixin, View):
+class FinalizarAtendimentoView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, View):
 
     # Só médicos.
     def test_func(self):
@@ -504,26 +739,25 @@ class FinalizarAtendimentoView(LoginRequiredMixin, UserPassesTestMixin, View):
     # Ação de finalizar é um POST.
     def post(self, request, *args, **kwargs):
         pk_atendimento = self.kwargs.get('pk') # Pk do FilaAtendimento.
-        atendimento = get_object_or_404(FilaAtendimento, pk=pk_atendimento)
+        atendimento = get_object_or_404(FilaAtendimento.objects.select_related('paciente'), pk=pk_atendimento, unidade=self.unidade)
 
         paciente_nome = atendimento.paciente.nome_completo # Para as mensagens.
 
         # Lógica para finalizar dependendo do status atual.
-        if atendimento.status == 'AGUARDANDO':
-            # Se estava aguardando e o médico finalizou direto (ex: paciente não veio, mas quer registrar).
-            atendimento.status = 'ATENDIDO'
-            if not atendimento.data_hora_chamada: # Se não foi chamado formalmente antes.
-                atendimento.data_hora_chamada = timezone.now()
-            atendimento.data_hora_fim = timezone.now() # Registra hora do fim.
-            atendimento.save()
-            messages.success(request, f"Atendimento (que estava aguardando) do paciente {paciente_nome} finalizado com sucesso.")
-
-        elif atendimento.status == 'EM_ATENDIMENTO':
-            # Fluxo normal: estava em atendimento e foi finalizado.
-            atendimento.status = 'ATENDIDO'
-            atendimento.data_hora_fim = timezone.now()
-            atendimento.save()
-            messages.success(request, f"Atendimento do paciente {paciente_nome} finalizado com sucesso.")
+        if atendimento.status in ('AGUARDANDO', 'EM_ATENDIMENTO'):
+            # A transição finalizar() cuida das horas de chamada/fim e grava o evento.
+            status_anterior = atendimento.status
+            try:
+                transicoes.finalizar(atendimento, usuario=request.user)
+                if status_anterior == 'AGUARDANDO':
+                    # Se estava aguardando e o médico finalizou direto (ex: paciente não veio, mas quer registrar).
+                    messages.success(request, f"Atendimento (que estava aguardando) do paciente {paciente_nome} finalizado com sucesso.")
+                else:
+                    # Fluxo normal: estava em atendimento e foi finalizado.
+                    messages.success(request, f"Atendimento do paciente {paciente_nome} finalizado com sucesso.")
+            except TransicaoInvalida:
+                # O status mudou entre a leitura acima e a trava da linha (ex: outra aba finalizou antes).
+                messages.warning(request, f"O atendimento de {paciente_nome} mudou de status enquanto era finalizado. Nenhuma ação realizada.")
 
         elif atendimento.status == 'ATENDIDO':
             messages.info(request, f"Este atendimento para {paciente_nome} já foi finalizado anteriormente.")
@@ -539,11 +773,12 @@ class FinalizarAtendimentoView(LoginRequiredMixin, UserPassesTestMixin, View):
 
 # View para listar os Pacientes cadastrados, com funcionalidade de busca.
 # Usada pelos Atendentes.
-class PacienteListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class PacienteListView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, ListView):
     model = Paciente
     template_name = 'paciente_list.html'
     context_object_name = 'pacientes_list'
     paginate_by = 10 # Paginação.
+    usar_replica = True # Busca só leitura: pode ir para a réplica (ver gestor_filas/middleware.py).
 
     # Só atendentes.
     def test_func(self):
@@ -551,7 +786,7 @@ class PacienteListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     # Define o queryset, aplicando filtro de busca se houver.
     def get_queryset(self):
-        queryset = Paciente.objects.all().order_by('nome_completo') # Todos os pacientes, ordenados por nome.
+        queryset = Paciente.objects.filter(unidade=self.unidade).order_by('nome_completo') # Todos os pacientes da unidade, ordenados por nome.
 
         query = self.request.GET.get('q') # Pego o parâmetro de busca 'q' da URL.
         if query:
@@ -574,3 +809,46 @@ class PacienteListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
         context['search_query'] = self.request.GET.get('q', '') # Se não houver 'q', usa string vazia.
         return context
 
+# View de busca textual nos atendimentos anteriores do próprio médico.
+# Procura nas anotações do atendimento (evolução, conduta, outro exame) e nos dados clínicos do paciente,
+# com radicais do português e sem diferença de acento (ver core/busca.py). Resultados por relevância.
+# Usada pelos Médicos.
+class BuscaAtendimentosView(LoginRequiredMixin, UserPassesTestMixin, UnidadeMixin, ListView):
+    template_name = 'busca_atendimentos.html'
+    context_object_name = 'resultados'
+    paginate_by = 20
+    usar_replica = True # Busca só leitura: pode ir para a réplica (ver gestor_filas/middleware.py).
+
+    # Só médicos com cadastro de Medico (a busca é sempre nos atendimentos dele).
+    def test_func(self):
+        return self.request.user.groups.filter(name='Médicos').exists() and hasattr(self.request.user, 'medico')
+
+    # Data do filtro (AAAA-MM-DD, formato do <input type="date">). Inválida ou vazia = sem limite.
+    def _data(self, nome):
+        try:
+            return parse_date(self.request.GET.get(nome, '').strip())
+        except ValueError: # Formato certo, data impossível (ex: 2024-02-30).
+            return None
+
+    def get_queryset(self):
+        self.termos = self.request.GET.get('q', '').strip()
+        self.data_inicio = self._data('de')
+        self.data_fim = self._data('ate')
+        # Sem termo não busco nada: listar todo o histórico não é o objetivo desta tela.
+        if not self.termos or not busca_disponivel():
+            return FilaAtendimento.objects.none()
+        return buscar_atendimentos(self.request.user.medico, self.termos, self.data_inicio, self.data_fim)
+
+    # Termos e datas de volta ao formulário, e os mesmos filtros nos links da paginação.
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['termos'] = self.termos
+        context['data_inicio'] = self.data_inicio
+        context['data_fim'] = self.data_fim
+        context['busca_disponivel'] = busca_disponivel()
+        context['filtros_url'] = urlencode({
+            'q': self.termos,
+            'de': self.data_inicio.isoformat() if self.data_inicio else '',
+            'ate': self.data_fim.isoformat() if self.data_fim else '',
+        })
+        return context
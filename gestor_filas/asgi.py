@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Para servir (as APIs async de core/api_async.py só rendem aqui; as views síncronas continuam funcionando):
+    uvicorn gestor_filas.asgi:application --workers 4 --host 0.0.0.0 --port 8000
+Cada worker tem o seu pool de conexões com o banco (DB_POOL_MAX no settings.py).
 """
 
 import os
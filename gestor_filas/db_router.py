@@ -0,0 +1,62 @@
+"""
+Roteamento de banco entre o primário ('default') e a réplica de leitura.
+
+Regra: escrita SEMPRE no primário; leitura no primário, a não ser que o código esteja
+dentro de um bloco "pode ler da réplica". Esse bloco é ligado:
+- pelo RoteamentoReplicaMiddleware (gestor_filas/middleware.py), nas views só de leitura;
+- pelo context manager ler_da_replica(), em comandos de relatório/exportação.
+
+Se settings.REPLICA_DB_ALIAS não estiver em DATABASES (réplica não configurada),
+tudo continua indo para o primário.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# ContextVar e não variável global: cada requisição (thread ou task async) tem o seu valor.
+_ler_da_replica = ContextVar('ler_da_replica', default=False)
+
+
+def replica_configurada():
+    return getattr(settings, 'REPLICA_DB_ALIAS', None) in settings.DATABASES
+
+
+# Liga a leitura pela réplica até o reset(token). Usado pelo middleware.
+def ativar_replica():
+    return _ler_da_replica.set(True)
+
+
+def desativar_replica(token):
+    _ler_da_replica.reset(token)
+
+
+# Para relatórios e exportações fora das views:
+#     with ler_da_replica():
+#         linhas = list(FilaAtendimento.objects.filter(...))
+@contextmanager
+def ler_da_replica():
+    token = ativar_replica()
+    try:
+        yield
+    finally:
+        desativar_replica(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _ler_da_replica.get() and replica_configurada():
+            return settings.REPLICA_DB_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    # Primário e réplica têm os mesmos dados, então objetos de um podem se relacionar com os do outro.
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    # Migrações só no primário; a réplica recebe o schema pela replicação.
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
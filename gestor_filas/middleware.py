@@ -0,0 +1,105 @@
+"""
+Middleware de roteamento para a réplica de leitura, com "leia o que você escreveu".
+
+- GET/HEAD em views marcadas como só leitura (atributo de classe `usar_replica = True`)
+  e nas listagens (changelist) do admin leem da réplica.
+- Qualquer requisição que escreve (POST, PUT, PATCH, DELETE) fixa a sessão no primário
+  por settings.REPLICA_JANELA_PRIMARIO segundos. Assim, quem acabou de chamar ou finalizar
+  um paciente nunca vê a fila "atrasada" da réplica logo em seguida.
+
+Precisa vir DEPOIS do SessionMiddleware e do AuthenticationMiddleware no settings.MIDDLEWARE.
+
+Funciona nos dois modos: no WSGI é chamado como função comum; no ASGI (gestor_filas/asgi.py) roda
+como corrotina, lendo/gravando a sessão com os métodos async. Assim a requisição não precisa pular
+para uma thread só por causa deste middleware, e o ContextVar da réplica é ligado e desligado
+no mesmo contexto da view.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db_router import ativar_replica, desativar_replica, replica_configurada
+
+# Chave na sessão com o timestamp até quando a sessão deve ler do primário.
+CHAVE_SESSAO_PRIMARIO = '_primario_ate'
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoteamentoReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.modo_async = iscoroutinefunction(get_response)
+        if self.modo_async:
+            # O Django decide pelo tipo do método se chama process_view com ou sem await.
+            markcoroutinefunction(self)
+            self.process_view = self._process_view_async
+
+    def __call__(self, request):
+        if self.modo_async:
+            return self.__acall__(request)
+        request._token_replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request._token_replica is not None:
+                desativar_replica(request._token_replica)
+
+        # Escreveu: fixa a sessão no primário pela janela configurada.
+        if request.method not in METODOS_SEGUROS and hasattr(request, 'session'):
+            request.session[CHAVE_SESSAO_PRIMARIO] = time.time() + settings.REPLICA_JANELA_PRIMARIO
+        return response
+
+    async def __acall__(self, request):
+        request._token_replica = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            if request._token_replica is not None:
+                desativar_replica(request._token_replica)
+
+        if request.method not in METODOS_SEGUROS and hasattr(request, 'session'):
+            await request.session.aset(CHAVE_SESSAO_PRIMARIO, time.time() + settings.REPLICA_JANELA_PRIMARIO)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in METODOS_SEGUROS
+            and replica_configurada()
+            and self._view_so_leitura(request, view_func)
+            and not self._fixada_no_primario(request)
+        ):
+            request._token_replica = ativar_replica()
+        return None
+
+    async def _process_view_async(self, request, view_func, view_args, view_kwargs):
+        if (
+            request.method in METODOS_SEGUROS
+            and replica_configurada()
+            and self._view_so_leitura(request, view_func)
+            and not await self._fixada_no_primario_async(request)
+        ):
+            request._token_replica = ativar_replica()
+        return None
+
+    # View de classe com `usar_replica = True`, ou changelist do admin.
+    def _view_so_leitura(self, request, view_func):
+        view_class = getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'usar_replica', False):
+            return True
+        match = request.resolver_match
+        return bool(match and match.namespace == 'admin' and (match.url_name or '').endswith('_changelist'))
+
+    def _fixada_no_primario(self, request):
+        if not hasattr(request, 'session'):
+            return False
+        return request.session.get(CHAVE_SESSAO_PRIMARIO, 0) > time.time()
+
+    async def _fixada_no_primario_async(self, request):
+        if not hasattr(request, 'session'):
+            return False
+        return await request.session.aget(CHAVE_SESSAO_PRIMARIO, 0) > time.time()
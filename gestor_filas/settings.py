@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Busca textual (SearchVectorField, GinIndex) nas anotações clínicas.
     'core',
     'widget_tweaks',
 ]
@@ -48,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'gestor_filas.middleware.RoteamentoReplicaMiddleware', # Leitura na réplica para views só leitura (depois de sessão/autenticação).
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,6 +89,67 @@ DATABASES = {
     }
 }
 
+# Conexões com o banco
+# Com o psycopg[pool] instalado, cada processo mantém um pool de conexões já abertas: a requisição pega
+# uma emprestada e devolve no fim, em vez de abrir (TCP + autenticação) e fechar uma conexão por requisição.
+# No ASGI, o ORM das views async roda no executor thread_sensitive do asgiref, uma thread por processo,
+# e não no event loop; o pool continua valendo (conexão emprestada por requisição, devolvida no fim).
+# O pool limita o total por processo (DB_POOL_MAX) e, quando está cheio, a requisição espera até
+# DB_POOL_TIMEOUT segundos por uma conexão livre.
+# Processos filhos criados com fork (ex: gerar_documentos) herdariam o pool do pai com os sockets abertos:
+# feche os pools antes de criar os processos (ver _fechar_conexoes_antes_do_fork em gerar_documentos).
+# O pool confere se a conexão ainda está viva antes de emprestar (check_connection): um Postgres
+# reiniciado ou um firewall que derrubou a conexão não vira erro 500 na próxima requisição.
+# Sem o pool (DB_POOL=0 ou pacote não instalado), as conexões ficam abertas por DB_CONN_MAX_AGE segundos,
+# com o mesmo teste de conexão viva (CONN_HEALTH_CHECKS) no começo de cada requisição.
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+if ConnectionPool is not None and os.environ.get('DB_POOL', '1') == '1':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'check': ConnectionPool.check_connection,
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Réplica de leitura (opcional).
+# Se DB_REPLICA_HOST estiver definido, crio o alias 'replica' com os mesmos dados de acesso do
+# primário, trocando só o que vier do ambiente. Sem ele, tudo continua no 'default'.
+# A réplica herda também a configuração de conexões acima (com pool, ela tem o seu próprio pool).
+# Para testar localmente com dois bancos: suba um segundo Postgres (ex: porta 5433) e rode com
+# DB_REPLICA_HOST=localhost DB_REPLICA_PORT=5433 (nos testes, a réplica espelha o 'default').
+# Os testes do roteamento (core/tests.py) usam um segundo banco separado de verdade, para ver de onde veio a leitura.
+REPLICA_DB_ALIAS = 'replica'
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES[REPLICA_DB_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Escrita sempre no primário; leitura na réplica só em views marcadas com usar_replica = True,
+# changelists do admin e blocos `with ler_da_replica()` (ver gestor_filas/db_router.py).
+DATABASE_ROUTERS = ['gestor_filas.db_router.ReplicaRouter']
+
+# Depois de uma escrita (ex: chamar/finalizar paciente), por quantos segundos a sessão fica lendo do primário.
+REPLICA_JANELA_PRIMARIO = int(os.environ.get('REPLICA_JANELA_PRIMARIO', 10))
+
+# Log de eventos da fila (core/eventos.py): segundos que o consumidor espera antes de pular um id que falta.
+# Tem que ser maior que a transação mais longa que grava eventos (as transições em lote).
+EVENTOS_ATRASO_SEGURANCA = float(os.environ.get('EVENTOS_ATRASO_SEGURANCA', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
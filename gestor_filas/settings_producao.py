@@ -0,0 +1,83 @@
+"""
+Perfil de produção do gestor_filas.
+
+Uso: DJANGO_SETTINGS_MODULE=gestor_filas.settings_producao
+(depois de rodar `python manage.py collectstatic --noinput` com este mesmo perfil).
+
+Parte das configurações de desenvolvimento (settings.py) e só sobrescreve
+o que muda em produção: DEBUG desligado, templates compilados em cache,
+cache de fragmentos e arquivos estáticos com hash no nome, pré-comprimidos
+(gzip/brotli) e servidos com cabeçalhos de cache de longa duração.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403 - herdo tudo do perfil base
+from .settings import BASE_DIR, MIDDLEWARE, TEMPLATES
+
+# Em produção nunca rodo com DEBUG ligado.
+DEBUG = False
+
+# Os hosts vêm do ambiente, separados por vírgula (ex: "fila.unidade.gov.br,10.0.0.5").
+ALLOWED_HOSTS = [h.strip() for h in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if h.strip()]
+
+
+# Templates
+# Com loaders explícitos, o APP_DIRS precisa ficar desligado.
+# O cached.Loader compila cada template (com todos aqueles comentários) uma vez só por processo,
+# em vez de reler e reparsear o arquivo a cada requisição.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+TEMPLATES[0]['OPTIONS']['debug'] = False
+
+
+# Cache
+# Usado pelos fragmentos {% cache %} dos templates (navbar, grade de exames).
+# LocMem é por processo; se tiver Redis/Memcached, basta trocar o BACKEND/LOCATION pelo ambiente.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'gestor-filas'),
+        'TIMEOUT': 300,
+    }
+}
+
+
+# Arquivos estáticos
+# O WhiteNoise serve os estáticos direto do processo da aplicação.
+# Ele precisa vir logo depois do SecurityMiddleware.
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1,
+                  'whitenoise.middleware.WhiteNoiseMiddleware')
+
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# CompressedManifestStaticFilesStorage: no collectstatic gera nomes com hash do conteúdo
+# (custom.3f2a1b.css) e grava versões .gz e .br (se o pacote Brotli estiver instalado) ao lado de cada arquivo.
+# Como o nome muda quando o conteúdo muda, os arquivos com hash podem ter cache "para sempre".
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Arquivos com hash no nome já recebem "max-age=315360000, immutable" do WhiteNoise.
+# Este valor vale só para os que não têm hash (ex: favicon.ico).
+WHITENOISE_MAX_AGE = 60 * 60 * 24
+
+
+# A chave de produção vem do ambiente (a do settings.py é só para desenvolvimento).
+# Sem ela o servidor nem sobe: prefiro isso a rodar em produção assinando sessões com a chave pública do repositório.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Defina DJANGO_SECRET_KEY no ambiente para usar o settings_producao.')